@@ -14,8 +14,287 @@ Think of it like a librarian who:
 import fitz  # For reading PDF files
 import docx            # For reading Word documents
 import os             # For file operations
-from typing import List, Dict, Any  # For type hints
-from langchain.text_splitter import RecursiveCharacterTextSplitter  # Smart text splitting
+import re             # For finding places to split text
+import itertools      # For flattening match offsets
+import logging        # For reporting skipped PDF pages
+import mmap           # For reading large text files without copying them
+from collections.abc import Sequence  # Base class for our compact chunk list
+from concurrent.futures import Executor, ProcessPoolExecutor  # For reading PDF pages in parallel
+from typing import Dict, Any, BinaryIO, Iterator, Optional, Tuple, Union  # For type hints
+import numpy as np    # For fast lookups in the split-point arrays
+
+try:
+    from numba import njit  # Compiles the chunk packing loop to machine code
+except ImportError:  # numba is optional - we fall back to a NumPy version
+    njit = None
+
+logger = logging.getLogger(__name__)
+
+# PDFs with fewer pages than this per worker are read in a single process -
+# starting worker processes costs more than it saves on small files
+MIN_PAGES_PER_WORKER = 16
+
+# Plain-text extraction settings for PDF pages. We only need the raw text for
+# chunking, so we skip ligature/image handling and reading-order sorting
+# (sort=False below). Text outside the visible page is left out.
+# (TEXT_INHIBIT_SPACES must stay off: many PDFs, e.g. everything made with
+# LaTeX, space words by moving the pen rather than with space characters,
+# and that flag would glue those words together)
+PDF_TEXT_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+
+# Pages whose drawing instructions take up more than this many bytes in the
+# file are plots with huge numbers of points or figures drawn line by line.
+# They hold little more than axis labels, yet reading their text means
+# working through every drawing instruction - so they're skipped unread.
+# (This is the stored, usually compressed, size - about 2 MB unpacked.)
+# Set PDF_HEAVY_PAGE_BYTES=0 to read every page, whatever its size
+HEAVY_PAGE_STREAM_BYTES = int(os.getenv("PDF_HEAVY_PAGE_BYTES", "500000"))
+
+# Every natural break point - paragraph, line, sentence or word - ends in
+# whitespace, so a single pattern finds all the places we're allowed to cut
+_BOUNDARY_RE = re.compile(r"\s+")
+
+
+def _stored_stream_length(doc: fitz.Document, xref: int) -> int:
+    """
+    How many bytes a stream takes up in the PDF file, read from its /Length
+    entry - the stream itself is neither read nor unpacked
+    """
+    kind, value = doc.xref_get_key(xref, "Length")
+    if kind == "xref":
+        # The length is kept in an object of its own ("12 0 R")
+        value = doc.xref_object(int(value.split()[0]))
+    try:
+        return int(value)
+    except ValueError:
+        return 0  # Missing or broken - treat the page as a normal one
+
+
+def _pages_text(doc: fitz.Document, lo: int, hi: int) -> str:
+    """Extract text from pages [lo, hi) of an already opened PDF"""
+    # Collect page texts in a list and join once - repeated `+=` on a
+    # growing string copies it on every page
+    parts = []
+    for page in doc.pages(lo, hi):  # Iterating pages directly avoids load_page() lookups
+        if HEAVY_PAGE_STREAM_BYTES:
+            stream_size = sum(_stored_stream_length(doc, xref) for xref in page.get_contents())
+            if stream_size > HEAVY_PAGE_STREAM_BYTES:
+                logger.warning("Skipping page %d of %s: %d bytes of drawing instructions "
+                               "(set PDF_HEAVY_PAGE_BYTES=0 to read it anyway)",
+                               page.number + 1, doc.name or "PDF", stream_size)
+                continue
+        parts.append(page.get_text("text", flags=PDF_TEXT_FLAGS, sort=False))
+    return "".join(parts)
+
+
+def _extract_range(file_path: str, lo: int, hi: int) -> str:
+    """
+    Extract text from pages [lo, hi) of a PDF file
+
+    This lives at module level (not on the class) so worker processes can run it.
+    Each worker opens its own copy of the PDF because fitz documents can't be
+    sent between processes.
+    """
+    doc = fitz.open(file_path)
+    try:
+        return _pages_text(doc, lo, hi)
+    finally:
+        doc.close()
+
+
+def _boundary_offsets(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find every run of whitespace in the text in one pass
+    
+    Returns:
+        (gap_starts, gap_ends) - where each whitespace run begins and ends.
+        A chunk may end at any gap start and begin at any gap end.
+    """
+    offsets = np.fromiter(
+        itertools.chain.from_iterable(m.span() for m in _BOUNDARY_RE.finditer(text)),
+        dtype=np.int64,
+    )
+    return offsets[0::2], offsets[1::2]
+
+
+def _pack_windows_numpy(gap_starts: np.ndarray, gap_ends: np.ndarray, text_len: int,
+                        chunk_size: int, chunk_overlap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Greedily pack the text into chunks of at most chunk_size characters
+    
+    Each chunk is made as long as possible while still ending between two
+    words, and the next one starts up to chunk_overlap characters earlier
+    (again at the start of a word). Leading/trailing whitespace is never
+    part of a chunk.
+    
+    This is a pure function with no shared state, so any number of threads
+    can chunk documents at the same time without locking.
+    
+    Returns:
+        (starts, ends) - the character range of every chunk
+    """
+    n_gaps = len(gap_starts)
+    starts, ends = [], []
+    
+    # Look these methods up once instead of on every loop iteration
+    find_cut = gap_starts.searchsorted
+    find_restart = gap_ends.searchsorted
+    add_start, add_end = starts.append, ends.append
+    
+    # Skip whitespace at the very beginning and end of the text
+    cursor = int(gap_ends[0]) if n_gaps and gap_starts[0] == 0 else 0
+    text_end = int(gap_starts[-1]) if n_gaps and gap_ends[-1] == text_len else text_len
+    
+    while cursor < text_end:
+        limit = cursor + chunk_size
+        if limit >= text_end:
+            # Everything that's left fits in one chunk
+            add_start(cursor)
+            add_end(text_end)
+            break
+        
+        # Cut at the last gap that starts inside this window so words stay whole
+        j = int(find_cut(limit, side='right')) - 1
+        if j >= 0 and gap_starts[j] > cursor:
+            end = int(gap_starts[j])
+            next_word = int(gap_ends[j])
+        else:
+            # One giant "word" longer than a whole chunk - cut it anyway
+            end = next_word = limit
+        add_start(cursor)
+        add_end(end)
+        
+        # Step back by up to chunk_overlap characters, to the start of a word
+        k = int(find_restart(end - chunk_overlap, side='left'))
+        previous, cursor = cursor, (int(gap_ends[k]) if k < n_gaps else next_word)
+        if not (previous < cursor <= next_word):
+            cursor = next_word  # Always move forward
+    
+    return np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+
+
+def _pack_windows_loop(gap_starts: np.ndarray, gap_ends: np.ndarray, text_len: int,
+                       chunk_size: int, chunk_overlap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Same chunks as _pack_windows_numpy, written as plain loops for numba
+    
+    Chunk ends and overlap restart points only ever move forward, so instead
+    of a binary search per chunk we walk two cursors (j and k) through the
+    gap arrays once. Results go into arrays that double in size when full.
+    """
+    n_gaps = gap_starts.shape[0]
+    capacity = 16
+    starts = np.empty(capacity, dtype=np.int64)
+    ends = np.empty(capacity, dtype=np.int64)
+    count = 0
+    
+    # Skip whitespace at the very beginning and end of the text
+    cursor = 0
+    if n_gaps > 0 and gap_starts[0] == 0:
+        cursor = gap_ends[0]
+    text_end = text_len
+    if n_gaps > 0 and gap_ends[n_gaps - 1] == text_len:
+        text_end = gap_starts[n_gaps - 1]
+    
+    j = 0  # First gap starting after the current window
+    k = 0  # First gap ending at or after the current restart point
+    while cursor < text_end:
+        if count == capacity:
+            capacity *= 2
+            grown_starts = np.empty(capacity, dtype=np.int64)
+            grown_ends = np.empty(capacity, dtype=np.int64)
+            grown_starts[:count] = starts[:count]
+            grown_ends[:count] = ends[:count]
+            starts, ends = grown_starts, grown_ends
+        
+        limit = cursor + chunk_size
+        if limit >= text_end:
+            # Everything that's left fits in one chunk
+            starts[count] = cursor
+            ends[count] = text_end
+            count += 1
+            break
+        
+        # Cut at the last gap that starts inside this window so words stay whole
+        while j < n_gaps and gap_starts[j] <= limit:
+            j += 1
+        if j > 0 and gap_starts[j - 1] > cursor:
+            end = gap_starts[j - 1]
+            next_word = gap_ends[j - 1]
+        else:
+            # One giant "word" longer than a whole chunk - cut it anyway
+            end = limit
+            next_word = limit
+        starts[count] = cursor
+        ends[count] = end
+        count += 1
+        
+        # Step back by up to chunk_overlap characters, to the start of a word
+        while k < n_gaps and gap_ends[k] < end - chunk_overlap:
+            k += 1
+        restart = gap_ends[k] if k < n_gaps else next_word
+        if cursor < restart <= next_word:
+            cursor = restart
+        else:
+            cursor = next_word  # Always move forward
+    
+    return starts[:count].copy(), ends[:count].copy()
+
+
+# With numba installed the loop version is compiled (and cached on disk), which
+# is several times faster than the NumPy version on large documents
+if njit is not None:
+    _pack_windows = njit(cache=True)(_pack_windows_loop)
+else:
+    _pack_windows = _pack_windows_numpy
+
+
+class DocumentChunks(Sequence):
+    """
+    The chunks of one document, stored compactly
+    
+    Instead of a separate dict (with its own copy of the text) for every
+    chunk, we keep the document's text once plus two arrays saying where
+    each chunk starts and ends. The familiar chunk dicts are only built when
+    someone actually reads a chunk:
+    
+        {"content": "...", "metadata": {"source": ..., "chunk_id": ..., "total_chunks": ...}}
+    
+    Each access builds a fresh dict, so changes made to it aren't kept here.
+    """
+    
+    __slots__ = ("text", "source", "starts", "ends")
+    
+    def __init__(self, text: str, source: str, starts: np.ndarray, ends: np.ndarray):
+        self.text = text        # The full document text
+        self.source = source    # Which file this came from
+        self.starts = starts    # Where each chunk starts in the text
+        self.ends = ends        # Where each chunk ends in the text
+    
+    def __len__(self) -> int:
+        return len(self.starts)
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = range(len(self))[i]  # Handles negative indexes and raises IndexError
+        return self._chunk(i, int(self.starts[i]), int(self.ends[i]))
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i, (start, end) in enumerate(zip(self.starts.tolist(), self.ends.tolist())):
+            yield self._chunk(i, start, end)
+    
+    def _chunk(self, i: int, start: int, end: int) -> Dict[str, Any]:
+        """Build the dict for chunk number i"""
+        return {
+            "content": self.text[start:end],  # The actual text content
+            "metadata": {
+                "source": self.source,          # Which file this came from
+                "chunk_id": i,                  # Which chunk number this is
+                "total_chunks": len(self)       # How many chunks total in this document
+            }
+        }
+
 
 class DocumentProcessor:
     """
@@ -23,6 +302,9 @@ class DocumentProcessor:
     - Read different file types
     - Break long documents into smaller, searchable pieces
     - Remember where each piece came from
+    
+    It keeps no per-document state, so one instance can safely process
+    several documents from different threads at once.
     """
     
     def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
@@ -37,15 +319,12 @@ class DocumentProcessor:
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         
-        # This is our smart text splitter - it tries to break text at natural points
-        # like sentences or paragraphs, not in the middle of words
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,  # How to measure text length
-        )
+        # Optional shared process pool for reading big PDFs. The server sets
+        # this so all uploads share one bounded pool; when it's None we start
+        # a short-lived pool per PDF instead.
+        self.executor: Optional[Executor] = None
     
-    def process_document(self, file_path: str, filename: str) -> List[Dict[str, Any]]:
+    def process_document(self, file_path: str, filename: str) -> DocumentChunks:
         """
         Main function that processes any document type
         
@@ -54,7 +333,7 @@ class DocumentProcessor:
             filename: Original name of the file
             
         Returns:
-            List of chunks, each with content and metadata
+            Sequence of chunks, each with content and metadata
         """
         # Figure out what type of file this is by looking at the extension
         file_ext = os.path.splitext(filename)[1].lower()
@@ -69,64 +348,115 @@ class DocumentProcessor:
         else:
             raise ValueError(f"Sorry, I don't know how to read {file_ext} files yet!")
         
-        # Break the long text into smaller, manageable chunks
-        chunks = self.text_splitter.split_text(text)
+        return self._chunk_text(text, filename)
+    
+    def process_document_stream(self, stream: BinaryIO, filename: str) -> DocumentChunks:
+        """
+        Same as process_document, but reads the file from memory
         
-        # Create a list of chunk objects with metadata
-        chunk_docs = []
-        for i, chunk in enumerate(chunks):
-            chunk_docs.append({
-                "content": chunk,  # The actual text content
-                "metadata": {
-                    "source": filename,           # Which file this came from
-                    "chunk_id": i,               # Which chunk number this is
-                    "total_chunks": len(chunks)  # How many chunks total in this document
-                }
-            })
+        Used for small uploads so they never have to be written to disk first.
         
-        return chunk_docs
+        Args:
+            stream: A binary file-like object (e.g. io.BytesIO) holding the file
+            filename: Original name of the file
+            
+        Returns:
+            Sequence of chunks, each with content and metadata
+        """
+        file_ext = os.path.splitext(filename)[1].lower()
+        
+        if file_ext == '.pdf':
+            doc = fitz.open(stream=stream.read(), filetype="pdf")
+            try:
+                text = _pages_text(doc, 0, doc.page_count)
+            finally:
+                doc.close()
+        elif file_ext == '.docx':
+            text = self._extract_docx_text(stream)  # python-docx accepts file objects too
+        elif file_ext == '.txt':
+            # Same as _extract_txt_text: bad bytes become � instead of failing
+            text = stream.read().decode('utf-8', 'replace')
+        else:
+            raise ValueError(f"Sorry, I don't know how to read {file_ext} files yet!")
+        
+        return self._chunk_text(text, filename)
+    
+    def _chunk_text(self, text: str, filename: str) -> DocumentChunks:
+        """
+        Split extracted text into chunks and label each one with where it came from
+        """
+        # Break the long text into smaller, manageable chunks. We find all
+        # possible split points once, then pack them into chunk-sized windows,
+        # so the text is only scanned a single time.
+        gap_starts, gap_ends = _boundary_offsets(text)
+        starts, ends = _pack_windows(
+            gap_starts, gap_ends, len(text), self.chunk_size, self.chunk_overlap
+        )
+        
+        # The chunk dicts (content + metadata) are built lazily from these offsets
+        return DocumentChunks(text, filename, starts, ends)
     
     def _extract_pdf_text(self, file_path: str) -> str:
         """
         Extract text from a PDF file
         
         This is like having a robot read through every page of a PDF
-        and type out all the text it sees
+        and type out all the text it sees. Big PDFs are split into page ranges
+        and read by several robots (processes) at once.
         """
-        doc = fitz.open(file_path)  # Open the PDF
-        text = ""
+        # Only peek at the page count here - the workers do the actual reading
+        doc = fitz.open(file_path)
+        page_count = doc.page_count
+        doc.close()
+        
+        workers = min(os.cpu_count() or 1, page_count // MIN_PAGES_PER_WORKER)
+        if workers <= 1:
+            return _extract_range(file_path, 0, page_count)
+        
+        # Split the pages into contiguous ranges, one per worker
+        step = -(-page_count // workers)  # Ceiling division
+        bounds = [(lo, min(lo + step, page_count)) for lo in range(0, page_count, step)]
         
-        # Go through each page
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)  # Load this page
-            text += page.get_text()         # Extract text from this page
+        def read_ranges(executor: Executor) -> str:
+            # map() returns results in submission order, so pages stay in order
+            parts = executor.map(
+                _extract_range,
+                [file_path] * len(bounds),
+                [lo for lo, _ in bounds],
+                [hi for _, hi in bounds],
+            )
+            return "".join(parts)
         
-        doc.close()  # Close the PDF when done
-        return text
+        if self.executor is not None:
+            return read_ranges(self.executor)
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return read_ranges(executor)
     
-    def _extract_docx_text(self, file_path: str) -> str:
+    def _extract_docx_text(self, file_path: Union[str, BinaryIO]) -> str:
         """
         Extract text from a Word document (.docx)
         
-        This reads through all paragraphs in a Word document
+        This reads through all paragraphs in a Word document.
+        Accepts either a path or an open binary file object.
         """
         doc = docx.Document(file_path)  # Open the Word document
-        text = ""
-        
-        # Go through each paragraph
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"  # Add paragraph text plus a new line
         
-        return text
+        # Put each paragraph on its own line (one join instead of growing a string)
+        return "\n".join(paragraph.text for paragraph in doc.paragraphs)
     
     def _extract_txt_text(self, file_path: str) -> str:
         """
         Extract text from a plain text file (.txt)
         
-        This is the simplest - just read the file directly
+        This is the simplest - we map the file into memory and decode it in
+        one go, so a large file isn't held in memory twice (bytes + text)
         """
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
+        with open(file_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return ""  # mmap can't map an empty file
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return str(mapped, 'utf-8', 'replace')
 
 # Example of how this class works:
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+# backend/document_store.py
+
+"""
+This file keeps track of every uploaded document - its name, how many
+chunks it was split into, and whether it's still being processed.
+
+Think of it like the hotel's guest register:
+- Every guest (document) gets one line with their room number (ID)
+- Several receptionists can write in it at once without smudging each other's entries
+- Counting guests or totalling up rooms is a single lookup, not a walk down the hallway
+
+Under the hood this is a small SQLite database. By default it lives in memory;
+point it at a file to keep the register across restarts.
+"""
+
+import sqlite3    # Built-in SQL database
+import threading  # For a lock around the shared connection
+from typing import List, Dict, Any, Optional, Tuple  # For type hints
+
+
+class DocumentStore:
+    """
+    A thread-safe table of document metadata:
+    id, filename, chunks_count and status
+    """
+
+    def __init__(self, db_path: str = ":memory:"):
+        """
+        Open (or create) the document database
+
+        Args:
+            db_path: SQLite file to use, or ":memory:" for a throwaway in-memory database
+        """
+        # One connection shared by all threads; the lock makes sure only one
+        # thread talks to it at a time
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
+        with self._lock, self._conn:
+            if db_path != ":memory:":
+                # Write-ahead logging: readers don't wait for writers
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    id           TEXT PRIMARY KEY,
+                    filename     TEXT NOT NULL,
+                    chunks_count INTEGER NOT NULL DEFAULT 0,
+                    status       TEXT NOT NULL
+                )
+                """
+            )
+
+    def add(self, doc_id: str, filename: str, status: str, chunks_count: int = 0):
+        """Register a new document"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO documents (id, filename, chunks_count, status) VALUES (?, ?, ?, ?)",
+                (doc_id, filename, chunks_count, status),
+            )
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Look up one document, or None if it doesn't exist"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, filename, chunks_count, status FROM documents WHERE id = ?",
+                (doc_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def update(self, doc_id: str, status: Optional[str] = None, chunks_count: Optional[int] = None) -> bool:
+        """
+        Change a document's status and/or chunk count
+
+        Returns:
+            False if the document doesn't exist (e.g. it was deleted meanwhile)
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                """
+                UPDATE documents
+                SET status = COALESCE(?, status),
+                    chunks_count = COALESCE(?, chunks_count)
+                WHERE id = ?
+                """,
+                (status, chunks_count, doc_id),
+            )
+        return cursor.rowcount > 0
+
+    def delete(self, doc_id: str) -> bool:
+        """
+        Remove a document
+
+        Returns:
+            False if the document didn't exist
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        return cursor.rowcount > 0
+
+    def list(self) -> List[Dict[str, Any]]:
+        """All documents, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, filename, chunks_count, status FROM documents ORDER BY rowid"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Tuple[int, int]:
+        """
+        Returns:
+            (number of documents, total number of chunks) in one query
+        """
+        with self._lock:
+            count, total_chunks = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(chunks_count), 0) FROM documents"
+            ).fetchone()
+        return count, total_chunks
+
+    def __contains__(self, doc_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self.stats()[0]
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,70 @@
+# backend/ingest_cache.py
+
+"""
+This file remembers documents we've already processed, so uploading the
+exact same file again doesn't mean reading, chunking and embedding it again.
+
+Think of it like a photocopy archive:
+1. Every file gets a fingerprint based on its bytes (a SHA-256 hash)
+2. The first time we see a fingerprint, we do all the work and file away
+   the chunks and their vectors under that fingerprint
+3. The next time the same fingerprint shows up, we just pull out the copy
+"""
+
+import os       # For file operations
+import pickle   # For saving/loading cached results
+from typing import Dict, Any, Optional, Sequence, Tuple  # For type hints
+
+import numpy as np  # For the cached vectors
+
+
+class IngestCache:
+    """
+    A folder of pickled (chunks, embeddings) pairs, keyed by content hash
+    """
+    
+    def __init__(self, cache_dir: str):
+        """
+        Initialize the cache
+        
+        Args:
+            cache_dir: Folder where cached results are stored (created if missing)
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def _path(self, content_hash: str) -> str:
+        """Where the cached result for a fingerprint lives"""
+        return os.path.join(self.cache_dir, f"{content_hash}.pkl")
+    
+    def load(self, content_hash: str) -> Optional[Tuple[Sequence[Dict[str, Any]], np.ndarray]]:
+        """
+        Look up a previously processed file
+        
+        Returns:
+            (chunks, embeddings) if we've seen this file before, otherwise None
+        """
+        try:
+            with open(self._path(content_hash), 'rb') as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # A broken cache entry just means we process the file again
+            print(f"Ignoring unreadable cache entry {content_hash}: {str(e)}")
+            return None
+        
+        return data['chunks'], data['embeddings']
+    
+    def save(self, content_hash: str, chunks: Sequence[Dict[str, Any]], embeddings: np.ndarray):
+        """Remember the chunks and vectors for a processed file"""
+        path = self._path(content_hash)
+        
+        # Write to a temporary name first so a crash never leaves half a file behind
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump({
+                'chunks': chunks,
+                'embeddings': embeddings
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
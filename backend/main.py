@@ -12,23 +12,32 @@ Think of this as the front desk of a hotel:
 FastAPI automatically creates a web API with documentation at http://localhost:8000/docs
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException  # Web framework
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks  # Web framework
 from fastapi.middleware.cors import CORSMiddleware              # Allow frontend to connect
+from fastapi.responses import StreamingResponse                 # Send answers as they're written
 from pydantic import BaseModel                                 # Data validation
+import hashlib         # Content fingerprints for the ingest cache
+import io              # In-memory files
+import json            # Encoding streamed events
 import os              # File operations
 import tempfile        # Temporary files
 import uuid           # Unique IDs
-from typing import List, Dict, Any  # Type hints
+from typing import List, Dict, Any, Optional, Tuple  # Type hints
 import asyncio        # Async operations
+import multiprocessing  # Process start method for the ingestion pool
+from concurrent.futures import ProcessPoolExecutor  # Shared pool for PDF extraction
 from dotenv import load_dotenv  # Load environment variables
 
+# Load environment variables from .env file
+# (before importing our modules, so settings are in place when they load)
+load_dotenv()
+
 # Import our custom modules (the ones we just created!)
 from document_processor import DocumentProcessor
 from vector_store import VectorStore
 from rag_pipeline import RAGPipeline
-
-# Load environment variables from .env file
-load_dotenv()
+from ingest_cache import IngestCache
+from document_store import DocumentStore
 
 # Create FastAPI application
 app = FastAPI(
@@ -49,12 +58,18 @@ app.add_middleware(
     allow_headers=["*"],      # Allow all headers
 )
 
-# Initialize our components (like setting up departments in our hotel)
-print("🚀 Initializing RAG system components...")
-document_processor = DocumentProcessor(chunk_size=1000, chunk_overlap=200)
-vector_store = VectorStore()
-rag_pipeline = RAGPipeline(vector_store)
-print("✅ Components initialized successfully!")
+# Set VECTOR_STORE_DIR to keep the vectors (and, by default, the document
+# list below) across restarts. Unset = start empty on every run
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR")
+
+# Our components (like the departments in our hotel). They're set up in
+# startup_event rather than here: the PDF worker processes import this file
+# too when the server is started with `python main.py`, and each of them
+# loading the embedding model and databases would waste seconds and memory
+document_processor: Optional[DocumentProcessor] = None
+vector_store: Optional[VectorStore] = None
+rag_pipeline: Optional[RAGPipeline] = None
+ingest_cache: Optional[IngestCache] = None
 
 # Pydantic models for request/response validation
 # These define the "shape" of data that comes in and goes out
@@ -77,9 +92,112 @@ class DocumentInfo(BaseModel):
     chunks_count: int
     status: str
 
-# In-memory storage for document metadata
-# In production, this would be a proper database
-documents_db: Dict[str, DocumentInfo] = {}
+# Document metadata lives in a small SQLite database. It's kept next to the
+# vectors when VECTOR_STORE_DIR is set, and in memory otherwise;
+# DOCUMENTS_DB_PATH overrides either.
+# The two have to be kept (or forgotten) together: remembered vectors without
+# their documents can't be listed or deleted, and remembered documents
+# without their vectors can't be searched
+DOCUMENTS_DB_PATH = os.getenv("DOCUMENTS_DB_PATH") or (
+    os.path.join(VECTOR_STORE_DIR, "documents.db") if VECTOR_STORE_DIR else ":memory:"
+)
+if bool(VECTOR_STORE_DIR) != (DOCUMENTS_DB_PATH != ":memory:"):
+    raise RuntimeError(
+        "VECTOR_STORE_DIR and DOCUMENTS_DB_PATH must both be persistent or both "
+        "in memory - set both, or neither"
+    )
+documents_db: Optional[DocumentStore] = None
+
+# At most this many documents are ingested at the same time; extra uploads
+# wait their turn instead of all fighting over the CPU at once
+INGEST_SEM = asyncio.Semaphore(int(os.getenv("INGEST_PARALLEL_LIMIT", "15")))
+
+# One process pool shared by all uploads (created on startup), so parallel
+# PDF extraction never uses more processes than we have CPU cores. When
+# several server processes run (uvicorn --workers, which reads
+# WEB_CONCURRENCY), they split the cores between them; set
+# INGEST_PROCESSES to choose the pool size per server process yourself
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+INGEST_PROCESSES = int(os.getenv(
+    "INGEST_PROCESSES", str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))
+))
+ingest_executor: Optional[ProcessPoolExecutor] = None
+
+# Every server process keeps its own copy of the vectors in memory, so with
+# several of them each would only see its own uploads and they would keep
+# overwriting each other's saved store
+if VECTOR_STORE_DIR and WEB_CONCURRENCY > 1:
+    raise RuntimeError(
+        "VECTOR_STORE_DIR needs a single server process - set WEB_CONCURRENCY=1"
+    )
+
+# Chunks waiting to be stored in the vector database, as
+# (chunks, doc_id, cache_key) tuples. Created on startup and drained by
+# _embedding_worker.
+embed_queue: Optional[asyncio.Queue] = None
+embed_worker_task: Optional[asyncio.Task] = None
+
+# The embedding worker stores chunks once it has this many, or after
+# EMBED_FLUSH_SECONDS, whichever comes first
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "128"))
+EMBED_FLUSH_SECONDS = 0.5
+
+# Uploads are read in 1MB pieces so a huge file never sits in memory all at once
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Uploads up to this size are processed straight from memory (no temp file)
+IN_MEMORY_UPLOAD_LIMIT = 8 << 20
+
+async def _spool_upload(file: UploadFile, suffix: str) -> Tuple[Optional[io.BytesIO], Optional[str], str]:
+    """
+    Read an upload without ever holding more than IN_MEMORY_UPLOAD_LIMIT in RAM
+    
+    Small files are kept in memory. As soon as a file grows past the limit,
+    everything read so far is moved to a temporary file and the rest is
+    streamed straight to disk. The file's SHA-256 fingerprint is computed
+    along the way, so we never have to read it a second time.
+    
+    Returns:
+        (buffer, None, sha256) for small files, or (None, temp_path, sha256) for large ones
+    """
+    buffer = io.BytesIO()
+    temp_file = None
+    digest = hashlib.sha256()
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            if temp_file is None and buffer.tell() + len(chunk) > IN_MEMORY_UPLOAD_LIMIT:
+                # Too big for memory - switch to a temp file
+                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+                temp_file.write(buffer.getbuffer())
+                buffer = None
+            (temp_file or buffer).write(chunk)
+    except BaseException:
+        if temp_file is not None:
+            temp_file.close()
+            os.unlink(temp_file.name)
+        raise
+    
+    if temp_file is None:
+        buffer.seek(0)
+        return buffer, None, digest.hexdigest()
+    
+    temp_file.close()
+    return None, temp_file.name, digest.hexdigest()
+
+def _cache_key(content_hash: str, file_ext: str) -> str:
+    """
+    Ingest cache key for a file
+    
+    Besides the content, the result depends on how the file is read (its
+    type), how it is chunked and which encoder made the vectors (model,
+    backend and precision), so those are part of the key too.
+    """
+    return (
+        f"{content_hash}-{file_ext.lstrip('.')}"
+        f"-{document_processor.chunk_size}x{document_processor.chunk_overlap}"
+        f"-{vector_store.encoder.name}"
+    )
 
 # API ENDPOINTS (like different services at our hotel front desk)
 
@@ -95,16 +213,157 @@ def read_root():
         "docs": "Visit /docs for API documentation"
     }
 
+async def _ingest(doc_id: str, filename: str, buffer: Optional[io.BytesIO], temp_path: Optional[str],
+                  cache_key: str):
+    """
+    Process an uploaded document in the background
+    
+    This is the "housekeeping" that happens after check-in: read and chunk
+    the document, store the chunks in the vector database, then update the
+    document's status so the frontend can see it's ready.
+    """
+    async with INGEST_SEM:
+        await _ingest_document(doc_id, filename, buffer, temp_path, cache_key)
+
+async def _ingest_document(doc_id: str, filename: str, buffer: Optional[io.BytesIO], temp_path: Optional[str],
+                           cache_key: str):
+    """Does the actual work for _ingest once a free ingestion slot is available"""
+    try:
+        documents_db.update(doc_id, status="processing")
+        loop = asyncio.get_running_loop()
+        
+        # Seen this exact file before? Then reuse its chunks and vectors
+        cached = await loop.run_in_executor(None, ingest_cache.load, cache_key)
+        if cached is not None:
+            chunks, embeddings = cached
+            print(f"♻️ Reusing cached chunks for {filename}")
+            chunks.source = filename  # Same content, maybe under a new name
+            await vector_store.add_documents(chunks, doc_id, embeddings=embeddings)
+            await _mark_stored(chunks, doc_id)
+            await _save_vector_store()
+            return
+        
+        # STEP 3: Process the document (extract text and create chunks)
+        print(f"🔄 Processing document {filename}...")
+        # Extraction is CPU-heavy, so run it off the event loop
+        if temp_path:
+            chunks = await loop.run_in_executor(
+                None, document_processor.process_document, temp_path, filename
+            )
+        else:
+            chunks = await loop.run_in_executor(
+                None, document_processor.process_document_stream, buffer, filename
+            )
+        print(f"✅ Created {len(chunks)} chunks from document")
+        
+        # STEP 4: Hand the chunks to the embedding worker, which stores them
+        # in the vector database together with chunks from other uploads
+        print("🗃️ Queueing chunks for the vector store...")
+        await embed_queue.put((chunks, doc_id, cache_key))
+        
+    except Exception as e:
+        print(f"❌ Unexpected error processing document {filename}: {str(e)}")
+        documents_db.update(doc_id, status="failed")
+    
+    finally:
+        # STEP 6: Clean up temporary file (like housekeeping)
+        if temp_path:
+            try:
+                os.unlink(temp_path)
+                print(f"🧹 Cleaned up temporary file: {temp_path}")
+            except:
+                pass  # If cleanup fails, it's not critical
+
+async def _embedding_worker():
+    """
+    Background task that moves queued chunks into the vector store
+    
+    Instead of storing each document on its own, we wait until we have
+    EMBED_BATCH_SIZE chunks (or EMBED_FLUSH_SECONDS have passed) and store
+    them all in one go - like a mail carrier who waits for a full bag
+    instead of driving every letter over separately.
+    """
+    loop = asyncio.get_running_loop()
+    
+    while True:
+        # Wait for the first document, then keep collecting until the batch is full
+        batch = [await embed_queue.get()]
+        pending_chunks = len(batch[0][0])
+        deadline = loop.time() + EMBED_FLUSH_SECONDS
+        
+        while pending_chunks < EMBED_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(embed_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            pending_chunks += len(item[0])
+        
+        await _store_batch(batch)
+
+async def _store_batch(batch: List[Tuple[List[Dict[str, Any]], str, str]]):
+    """Store one batch of (chunks, doc_id, cache_key) tuples and update each document's status"""
+    try:
+        embeddings = await vector_store.add_documents_batch(
+            [(chunks, doc_id) for chunks, doc_id, _ in batch]
+        )
+        print(f"✅ Stored {len(batch)} document(s) in the vector database")
+    except Exception as e:
+        print(f"❌ Error storing chunks in vector database: {str(e)}")
+        for _, doc_id, _ in batch:
+            documents_db.update(doc_id, status="failed")
+        return
+    
+    loop = asyncio.get_running_loop()
+    offset = 0
+    for chunks, doc_id, cache_key in batch:
+        # Remember the result so the same file is free next time
+        doc_embeddings = embeddings[offset:offset + len(chunks)]
+        offset += len(chunks)
+        try:
+            await loop.run_in_executor(None, ingest_cache.save, cache_key, chunks, doc_embeddings)
+        except Exception as e:
+            print(f"⚠️ Could not cache chunks for document {doc_id}: {str(e)}")
+        
+        await _mark_stored(chunks, doc_id)
+    
+    await _save_vector_store()
+
+async def _save_vector_store():
+    """
+    Write the vector store to VECTOR_STORE_DIR (when it's set)
+    
+    Done after every change rather than only at shutdown, so a crash or a
+    killed container never loses documents that the document list already
+    shows as processed.
+    """
+    try:
+        await vector_store.save()
+    except Exception as e:
+        print(f"⚠️ Could not save the vector store: {str(e)}")
+
+async def _mark_stored(chunks: List[Dict[str, Any]], doc_id: str):
+    """STEP 5: Update document metadata once its chunks are in the vector store"""
+    if not documents_db.update(doc_id, status="processed", chunks_count=len(chunks)):
+        # The document was deleted while we were still processing it
+        await vector_store.delete_document(doc_id)
+        return
+    print(f"📋 Document metadata saved for document {doc_id}")
+
 @app.post("/upload-document")
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     """
-    Upload and process a document
+    Upload a document for processing
     
     This is like a guest checking in - we:
     1. Receive their document
-    2. Process it (read and chunk it)
-    3. Store it in our searchable database
-    4. Give them a receipt (document ID)
+    2. Give them a receipt (document ID) right away
+    3. Process it (read, chunk and store it) in the background
+    
+    Poll /documents to see when the status changes to "processed".
     """
     try:
         print(f"📤 Received upload request for: {file.filename}")
@@ -125,50 +384,27 @@ async def upload_document(file: UploadFile = File(...)):
         doc_id = str(uuid.uuid4())  # Generate unique ID like "abc123-def456-..."
         print(f"📝 Generated document ID: {doc_id}")
         
-        # Create a temporary file to store the uploaded content
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-            content = await file.read()  # Read the uploaded file
-            temp_file.write(content)     # Write it to temp file
-            temp_path = temp_file.name   # Remember where we put it
+        # Read the upload - small files stay in memory, large ones go to a temp file
+        buffer, temp_path, content_hash = await _spool_upload(file, file_ext)
         
-        print(f"💾 Saved uploaded file to temporary location: {temp_path}")
+        if temp_path:
+            print(f"💾 Saved uploaded file to temporary location: {temp_path}")
+        else:
+            print("💾 Keeping small upload in memory")
         
-        try:
-            # STEP 3: Process the document (extract text and create chunks)
-            print("🔄 Processing document...")
-            chunks = document_processor.process_document(temp_path, file.filename)
-            print(f"✅ Created {len(chunks)} chunks from document")
-            
-            # STEP 4: Store chunks in vector database
-            print("🗃️ Adding chunks to vector store...")
-            await vector_store.add_documents(chunks, doc_id)
-            print("✅ Chunks stored in vector database")
-            
-            # STEP 5: Save document metadata
-            documents_db[doc_id] = DocumentInfo(
-                id=doc_id,
-                filename=file.filename,
-                chunks_count=len(chunks),
-                status="processed"
-            )
-            print(f"📋 Document metadata saved for {file.filename}")
-            
-            # Return success response
-            return {
-                "document_id": doc_id,
-                "filename": file.filename,
-                "chunks_processed": len(chunks),
-                "status": "success",
-                "message": f"Successfully processed '{file.filename}' into {len(chunks)} searchable chunks"
-            }
-            
-        finally:
-            # STEP 6: Clean up temporary file (like housekeeping)
-            try:
-                os.unlink(temp_path)
-                print(f"🧹 Cleaned up temporary file: {temp_path}")
-            except:
-                pass  # If cleanup fails, it's not critical
+        # Register the document now and process it after the response is sent
+        documents_db.add(doc_id, file.filename, status="queued")
+        background_tasks.add_task(
+            _ingest, doc_id, file.filename, buffer, temp_path, _cache_key(content_hash, file_ext)
+        )
+        
+        return {
+            "document_id": doc_id,
+            "filename": file.filename,
+            "chunks_processed": 0,
+            "status": "processing",
+            "message": f"Received '{file.filename}' - it is being processed in the background"
+        }
             
     except HTTPException:
         # Re-raise HTTP exceptions (these are expected errors)
@@ -228,6 +464,31 @@ async def query_documents(request: QueryRequest):
             detail=f"An error occurred while processing your question: {str(e)}"
         )
 
+@app.post("/query/stream")
+async def query_documents_stream(request: QueryRequest):
+    """
+    Same as /query, but streams the answer as it's being written
+    
+    The response is a Server-Sent Events stream. Each event is a JSON object:
+    - {"type": "token", "content": "..."}  - the next piece of the answer
+    - {"type": "error", "message": "..."}  - if the answer couldn't be finished
+    - {"type": "done", "sources": [...], "confidence": 0.87} - always last
+    """
+    print(f"❓ Received streaming query: '{request.question}'")
+    
+    # Check if any documents have been uploaded
+    if not documents_db:
+        raise HTTPException(
+            status_code=400, 
+            detail="No documents have been uploaded yet. Please upload some documents first!"
+        )
+    
+    async def event_stream():
+        async for event in rag_pipeline.query_stream(request.question, request.chat_history):
+            yield f"data: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/documents")
 def list_documents():
     """
@@ -235,10 +496,11 @@ def list_documents():
     
     This is like asking for a list of all guests currently checked in
     """
-    print(f"📋 Listing {len(documents_db)} uploaded documents")
+    documents = documents_db.list()
+    print(f"📋 Listing {len(documents)} uploaded documents")
     return {
-        "documents": list(documents_db.values()),
-        "total_count": len(documents_db)
+        "documents": [DocumentInfo(**doc) for doc in documents],
+        "total_count": len(documents)
     }
 
 @app.delete("/documents/{doc_id}")
@@ -249,21 +511,23 @@ async def delete_document(doc_id: str):
     This is like a guest checking out - we remove all their information
     """
     try:
-        if doc_id not in documents_db:
+        # Get document info before deletion
+        row = documents_db.get(doc_id)
+        if row is None:
             raise HTTPException(
                 status_code=404, 
                 detail=f"Document with ID '{doc_id}' not found"
             )
+        doc_info = DocumentInfo(**row)
         
-        # Get document info before deletion
-        doc_info = documents_db[doc_id]
         print(f"🗑️ Deleting document: {doc_info.filename} (ID: {doc_id})")
         
         # Remove from vector store
         await vector_store.delete_document(doc_id)
         
         # Remove from our metadata database
-        del documents_db[doc_id]
+        documents_db.delete(doc_id)
+        await _save_vector_store()
         
         print(f"✅ Successfully deleted document: {doc_info.filename}")
         
@@ -303,13 +567,13 @@ def get_stats():
     
     This provides an overview of system usage
     """
-    total_chunks = sum(doc.chunks_count for doc in documents_db.values())
+    total_documents, total_chunks = documents_db.stats()
     
     return {
-        "total_documents": len(documents_db),
+        "total_documents": total_documents,
         "total_chunks": total_chunks,
-        "average_chunks_per_document": total_chunks / len(documents_db) if documents_db else 0,
-        "vector_store_size": vector_store.index.ntotal if vector_store.is_initialized() else 0
+        "average_chunks_per_document": total_chunks / total_documents if total_documents else 0,
+        "vector_store_size": vector_store.ntotal
     }
 
 # Error handlers
@@ -331,9 +595,38 @@ async def startup_event():
     
     Like opening the hotel for business - we make sure everything is ready
     """
+    global document_processor, vector_store, rag_pipeline, ingest_cache, documents_db
+    global ingest_executor, embed_queue, embed_worker_task
+    
     print("🏨 Starting RAG Document Q&A System...")
+    
+    # Initialize our components (like setting up departments in our hotel)
+    print("🚀 Initializing RAG system components...")
+    document_processor = DocumentProcessor(chunk_size=1000, chunk_overlap=200)
+    vector_store = VectorStore(
+        compression=os.getenv("VECTOR_COMPRESSION", "none"),
+        cache_dir=VECTOR_STORE_DIR,
+    )
+    rag_pipeline = RAGPipeline(vector_store)
+    ingest_cache = IngestCache(os.getenv("INGEST_CACHE_DIR", "data/ingest_cache"))
+    documents_db = DocumentStore(DOCUMENTS_DB_PATH)
+    print("✅ Components initialized successfully!")
+    
     print("🔧 Checking configuration...")
     
+    # Shared worker processes for PDF extraction. "spawn" gives each worker a
+    # clean interpreter instead of forking a process that already runs
+    # PyTorch/FAISS threads.
+    ingest_executor = ProcessPoolExecutor(
+        max_workers=INGEST_PROCESSES,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    document_processor.executor = ingest_executor
+    
+    # Start the worker that batches chunks into the vector store
+    embed_queue = asyncio.Queue()
+    embed_worker_task = asyncio.create_task(_embedding_worker())
+    
     # Check if OpenAI API key is configured
     if not os.getenv("OPENAI_API_KEY"):
         print("⚠️  WARNING: OPENAI_API_KEY not found in environment variables!")
@@ -355,9 +648,23 @@ async def shutdown_event():
     """
     print("🛑 Shutting down RAG Document Q&A System...")
     
+    # Stop the embedding worker
+    if embed_worker_task is not None:
+        embed_worker_task.cancel()
+    
+    # Stop the PDF extraction worker processes
+    if ingest_executor is not None:
+        document_processor.executor = None
+        ingest_executor.shutdown()
+    
+    # Close the document database
+    documents_db.close()
+    
+    # Keep the vectors for the next start (when VECTOR_STORE_DIR is set).
+    # Normally already saved after the last change; this catches the rest
+    await vector_store.save()
+    
     # In a production system, you might want to:
-    # - Save the vector store to disk
-    # - Close database connections
     # - Clean up temporary files
     
     print("👋 Shutdown complete!")
@@ -15,9 +15,58 @@ Think of it like a smart research assistant that:
 4. Tells you exactly which documents it used
 """
 
-import openai  # For calling OpenAI's GPT models
-from typing import List, Dict, Any  # For type hints
+from openai import AsyncOpenAI, AuthenticationError, RateLimitError  # For calling OpenAI's GPT models
+import httpx   # HTTP connection pool used by the OpenAI client
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple, Union  # For type hints
+from collections import OrderedDict  # For the answer cache
+import hashlib # For answer cache keys
+import asyncio # For overlapping retrieval with prompt building
 import os      # For environment variables
+import numpy as np  # For averaging scores
+
+# The instructions we give GPT never change, so we build them once. Keeping
+# the start of every request identical also lets OpenAI's prompt caching
+# reuse work from earlier requests.
+SYSTEM_PROMPT = """You are a helpful AI assistant that answers questions based ONLY on the provided document context.
+
+Your job is to:
+1. Read through the provided context carefully
+2. Answer the user's question using ONLY information from the context
+3. Be accurate and comprehensive
+4. If the context doesn't contain enough information, say so honestly
+5. Synthesize information from multiple sources when relevant
+6. Maintain a helpful and professional tone
+
+Important rules:
+- NEVER make up information that's not in the context
+- If you're unsure, say "Based on the provided documents..."
+- If the context is insufficient, suggest what additional information might be needed
+- Always be honest about the limitations of your knowledge based on the provided context"""
+
+# How many recent answers to remember for questions asked again word for word
+ANSWER_CACHE_SIZE = 256
+
+# How many characters of each source to show as a preview
+PREVIEW_LEN = 200
+
+# One async OpenAI client shared by the whole process. Its connection pool
+# keeps HTTPS connections open between questions, so we don't pay for a new
+# TLS handshake on every call. Created by the first RAGPipeline (not at
+# import time) so the API key from .env has been loaded by then.
+_client: Optional[AsyncOpenAI] = None
+
+def _get_client(api_key: str) -> AsyncOpenAI:
+    """Return the shared OpenAI client, creating it on first use"""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=api_key,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                timeout=httpx.Timeout(60.0, connect=5.0),  # Long answers can take a while
+            ),
+        )
+    return _client
 
 class RAGPipeline:
     """
@@ -39,10 +88,18 @@ class RAGPipeline:
         self.vector_store = vector_store
         
         # Set up OpenAI API key
-        openai.api_key = os.getenv("OPENAI_API_KEY")
+        api_key = os.getenv("OPENAI_API_KEY")
         
-        if not openai.api_key:
+        if not api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables!")
+        
+        # Async client - awaiting it lets the server handle other requests
+        # while GPT is writing an answer
+        self.client = _get_client(api_key)
+        
+        # Recent answers keyed by a hash of the full prompt, so asking the exact
+        # same question about the exact same sources doesn't call GPT again
+        self._answer_cache: "OrderedDict[str, str]" = OrderedDict()
     
     async def query(self, question: str, chat_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
         """
@@ -57,11 +114,121 @@ class RAGPipeline:
         Returns:
             Dictionary with answer, sources, and confidence score
         """
+        prepared = await self._prepare(question, chat_history)
+        if isinstance(prepared, dict):
+            return prepared  # Nothing usable was found - this is already the final answer
+        system_prompt, user_prompt, sources, valid_results = prepared
+        
+        # STEP 6: Generate response using OpenAI (unless we've answered this exact prompt before)
+        print("✨ Step 6: Generating AI response...")
+        try:
+            cache_key = self._answer_cache_key(user_prompt)
+            response = self._get_cached_answer(cache_key)
+            if response is None:
+                response = await self._call_openai(system_prompt, user_prompt)
+                self._cache_answer(cache_key, response)
+            
+            # Calculate average confidence from search results
+            avg_confidence = self._average_confidence(valid_results)
+            
+            print(f"✅ Successfully generated response with {len(sources)} sources")
+            
+            return {
+                "answer": response,
+                "sources": sources,
+                "confidence": float(avg_confidence)
+            }
+            
+        except Exception as e:
+            print(f"❌ Error generating response: {str(e)}")
+            return {
+                "answer": f"I found relevant documents but encountered an error while generating the response: {str(e)}",
+                "sources": sources,
+                "confidence": 0.0
+            }
+    
+    async def query_stream(self, question: str, chat_history: List[Dict[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Same as query(), but yields the answer piece by piece as GPT writes it
+        
+        The user starts reading after the first few words instead of waiting
+        for the whole answer.
+        
+        Yields:
+            {"type": "token", "content": "..."} for each piece of the answer, then
+            {"type": "done", "sources": [...], "confidence": 0.87} at the end
+            ({"type": "error", "message": "..."} if generation fails)
+        """
+        prepared = await self._prepare(question, chat_history)
+        if isinstance(prepared, dict):
+            yield {"type": "token", "content": prepared["answer"]}
+            yield {"type": "done", "sources": prepared["sources"], "confidence": prepared["confidence"]}
+            return
+        system_prompt, user_prompt, sources, valid_results = prepared
+        
+        # STEP 6: Stream the response from OpenAI (unless we've answered this exact prompt before)
+        print("✨ Step 6: Streaming AI response...")
+        try:
+            cache_key = self._answer_cache_key(user_prompt)
+            cached_answer = self._get_cached_answer(cache_key)
+            if cached_answer is not None:
+                yield {"type": "token", "content": cached_answer}
+            else:
+                tokens = []
+                async for token in self._stream_openai(system_prompt, user_prompt):
+                    tokens.append(token)
+                    yield {"type": "token", "content": token}
+                self._cache_answer(cache_key, "".join(tokens).strip())
+        except Exception as e:
+            print(f"❌ Error generating response: {str(e)}")
+            yield {"type": "error", "message": str(e)}
+            yield {"type": "done", "sources": sources, "confidence": 0.0}
+            return
+        
+        # Calculate average confidence from search results
+        avg_confidence = self._average_confidence(valid_results)
+        
+        print(f"✅ Successfully streamed response with {len(sources)} sources")
+        yield {"type": "done", "sources": sources, "confidence": float(avg_confidence)}
+    
+    async def _prepare(self, question: str, chat_history: List[Dict[str, str]] = None
+                       ) -> Union[Dict[str, Any], Tuple[str, str, List[Dict[str, Any]], list]]:
+        """
+        Steps 1-5 of the pipeline: everything up to calling GPT
+        
+        Converting the question to a vector is the slow part, so it runs in
+        the background while the chat history and system prompt are prepared.
+        
+        Returns:
+            (system_prompt, user_prompt, sources, valid_results) when we found
+            something to answer from, otherwise a final answer dict
+        """
         print(f"\n🔍 Processing query: '{question}'")
         
-        # STEP 1: RETRIEVAL - Find relevant documents
+        # STEP 1: RETRIEVAL - Start converting the question to a vector. This
+        # runs in the background while we prepare the rest of the prompt.
         print("📚 Step 1: Searching for relevant documents...")
-        search_results = await self.vector_store.similarity_search(question, k=5)
+        embedding_task = asyncio.create_task(self.vector_store.embed_query(question))
+        
+        # STEP 2: Build chat history context (if provided) while the model works
+        print("💬 Step 2: Adding chat history context...")
+        history_context = ""
+        if chat_history:
+            recent_history = chat_history[-4:]  # Last 4 messages for context
+            history_parts = []
+            
+            for msg in recent_history:
+                role = msg.get("role", "user")
+                content = msg.get("content", "")
+                history_parts.append(f"{role.title()}: {content}")
+            
+            if history_parts:
+                history_context = f"\n\nPrevious conversation:\n" + "\n".join(history_parts)
+        
+        system_prompt = self._create_system_prompt()
+        
+        # Now wait for the question's vector and find the closest chunks
+        search_results = await self.vector_store.search_by_vector(await embedding_task, k=5)
         
         # Check if we found any documents
         if not search_results:
@@ -71,28 +238,19 @@ class RAGPipeline:
                 "confidence": 0.0
             }
         
-        # STEP 2: Filter out deleted documents
-        print("🧹 Step 2: Filtering valid documents...")
-        valid_results = [
-            (doc, score) for doc, score in search_results 
-            if not doc["metadata"].get("deleted", False)
-        ]
-        
-        if not valid_results:
-            return {
-                "answer": "I found some documents, but they seem to have been deleted. Please upload some documents first!",
-                "sources": [],
-                "confidence": 0.0
-            }
+        # STEP 3: Deleted documents were already left out by the vector store
+        valid_results = search_results
         
-        # STEP 3: Build context from retrieved documents
-        print("📝 Step 3: Building context from retrieved documents...")
+        # STEP 4: Build context from retrieved documents
+        print("📝 Step 4: Building context from retrieved documents...")
         context_parts = []
         sources = []
         
         for i, (doc, score) in enumerate(valid_results):
+            content = doc["content"]
+            
             # Create a formatted context entry
-            context_entry = f"[Source {i+1}: {doc['metadata']['source']}]\n{doc['content']}"
+            context_entry = f"[Source {i+1}: {doc['metadata']['source']}]\n{content}"
             context_parts.append(context_entry)
             
             # Store source information for citation
@@ -100,55 +258,23 @@ class RAGPipeline:
                 "source": doc["metadata"]["source"],
                 "chunk_id": doc["metadata"]["chunk_id"],
                 "confidence": float(score),
-                "preview": doc["content"][:200] + "..." if len(doc["content"]) > 200 else doc["content"]
+                "preview": content[:PREVIEW_LEN] + ("..." if len(content) > PREVIEW_LEN else "")
             })
         
         # Join all context parts
         context = "\n\n" + "="*50 + "\n\n".join(context_parts)
         
-        # STEP 4: Build chat history context (if provided)
-        print("💬 Step 4: Adding chat history context...")
-        history_context = ""
-        if chat_history:
-            recent_history = chat_history[-4:]  # Last 4 messages for context
-            history_parts = []
-            
-            for msg in recent_history:
-                role = msg.get("role", "user")
-                content = msg.get("content", "")
-                history_parts.append(f"{role.title()}: {content}")
-            
-            if history_parts:
-                history_context = f"\n\nPrevious conversation:\n" + "\n".join(history_parts)
-        
         # STEP 5: AUGMENTED GENERATION - Create the prompt
         print("🤖 Step 5: Building AI prompt...")
-        system_prompt = self._create_system_prompt()
         user_prompt = self._create_user_prompt(question, context, history_context)
         
-        # STEP 6: Generate response using OpenAI
-        print("✨ Step 6: Generating AI response...")
-        try:
-            response = await self._call_openai(system_prompt, user_prompt)
-            
-            # Calculate average confidence from search results
-            avg_confidence = sum(score for _, score in valid_results) / len(valid_results)
-            
-            print(f"✅ Successfully generated response with {len(sources)} sources")
-            
-            return {
-                "answer": response,
-                "sources": sources,
-                "confidence": float(avg_confidence)
-            }
-            
-        except Exception as e:
-            print(f"❌ Error generating response: {str(e)}")
-            return {
-                "answer": f"I found relevant documents but encountered an error while generating the response: {str(e)}",
-                "sources": sources,
-                "confidence": 0.0
-            }
+        return system_prompt, user_prompt, sources, valid_results
+    
+    @staticmethod
+    def _average_confidence(valid_results: List[Tuple[Dict[str, Any], float]]) -> float:
+        """Average similarity score of the retrieved chunks"""
+        scores = np.fromiter((score for _, score in valid_results), dtype=np.float32, count=len(valid_results))
+        return float(scores.mean())
     
     def _create_system_prompt(self) -> str:
         """
@@ -156,39 +282,28 @@ class RAGPipeline:
         
         This is like giving instructions to a human assistant about how to do their job
         """
-        return """You are a helpful AI assistant that answers questions based ONLY on the provided document context.
-
-Your job is to:
-1. Read through the provided context carefully
-2. Answer the user's question using ONLY information from the context
-3. Be accurate and comprehensive
-4. If the context doesn't contain enough information, say so honestly
-5. Synthesize information from multiple sources when relevant
-6. Maintain a helpful and professional tone
-
-Important rules:
-- NEVER make up information that's not in the context
-- If you're unsure, say "Based on the provided documents..."
-- If the context is insufficient, suggest what additional information might be needed
-- Always be honest about the limitations of your knowledge based on the provided context"""
+        return SYSTEM_PROMPT
     
     def _create_user_prompt(self, question: str, context: str, history_context: str) -> str:
         """
         Create the user prompt with the question and all context
         
-        This assembles all the information the AI needs to answer the question
+        This assembles all the information the AI needs to answer the question.
+        The parts that change least go first (document context), and the parts
+        that change most go last (chat history, question), so repeated
+        questions about the same sources share as long a prefix as possible.
         """
         prompt_parts = [
             "Please answer the following question based on the document context provided below."
         ]
         
+        # Add document context
+        prompt_parts.append(f"\nDocument context:{context}")
+        
         # Add chat history if available
         if history_context.strip():
             prompt_parts.append(f"\nFor additional context, here's our recent conversation:{history_context}")
         
-        # Add document context
-        prompt_parts.append(f"\nDocument context:{context}")
-        
         # Add the actual question
         prompt_parts.append(f"\nQuestion: {question}")
         
@@ -200,6 +315,53 @@ Important rules:
         
         return "\n".join(prompt_parts)
     
+    def _answer_cache_key(self, user_prompt: str) -> str:
+        """The user prompt holds the sources, history and question, so it identifies the answer"""
+        return hashlib.sha256(user_prompt.encode("utf-8")).hexdigest()
+    
+    def _get_cached_answer(self, cache_key: str) -> Optional[str]:
+        """Look up a previous answer (and mark it as recently used)"""
+        answer = self._answer_cache.get(cache_key)
+        if answer is not None:
+            self._answer_cache.move_to_end(cache_key)
+            print("♻️ Reusing cached answer for an identical prompt")
+        return answer
+    
+    def _cache_answer(self, cache_key: str, answer: str):
+        """Remember an answer, forgetting the oldest one when the cache is full"""
+        self._answer_cache[cache_key] = answer
+        self._answer_cache.move_to_end(cache_key)
+        if len(self._answer_cache) > ANSWER_CACHE_SIZE:
+            self._answer_cache.popitem(last=False)
+    
+    async def _stream_openai(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """
+        Same as _call_openai, but yields the answer as it is being generated
+        """
+        try:
+            response = await self.client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.1,
+                max_tokens=800,
+                top_p=0.9,
+                stream=True
+            )
+            
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            
+        except RateLimitError:
+            raise Exception("OpenAI rate limit exceeded. Please wait a moment and try again.")
+        except AuthenticationError:
+            raise Exception("OpenAI authentication failed. Please check your API key.")
+        except Exception as e:
+            raise Exception(f"OpenAI API error: {str(e)}")
+    
     async def _call_openai(self, system_prompt: str, user_prompt: str) -> str:
         """
         Make the actual call to OpenAI's API
@@ -207,7 +369,7 @@ Important rules:
         This is where we send our carefully crafted prompt to GPT and get back an answer
         """
         try:
-            response = openai.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model="gpt-3.5-turbo",  # Use gpt-4 if you have access and want better quality
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -220,9 +382,9 @@ Important rules:
             
             return response.choices[0].message.content.strip()
             
-        except openai.RateLimitError:
+        except RateLimitError:
             raise Exception("OpenAI rate limit exceeded. Please wait a moment and try again.")
-        except openai.AuthenticationError:
+        except AuthenticationError:
             raise Exception("OpenAI authentication failed. Please check your API key.")
         except Exception as e:
             raise Exception(f"OpenAI API error: {str(e)}")
@@ -0,0 +1,150 @@
+# backend/tests/test_document_processor.py
+
+"""
+Tests for reading and chunking documents
+
+Run from the backend folder with:
+    python -m pytest tests
+"""
+
+import io
+import os
+import random
+import sys
+
+import fitz
+import numpy as np
+import pytest
+
+# The backend modules import each other by plain name (e.g. `import document_processor`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import document_processor  # noqa: E402
+from document_processor import (  # noqa: E402
+    PDF_TEXT_FLAGS,
+    DocumentProcessor,
+    _boundary_offsets,
+    _pack_windows,
+    _pack_windows_loop,
+    _pack_windows_numpy,
+    _stored_stream_length,
+)
+
+
+def _pdf(content: bytes, indirect_length: bool = False) -> bytes:
+    """
+    A one-page PDF whose page draws `content` with Helvetica as /F1
+
+    With indirect_length, the content stream's /Length is kept in an object
+    of its own ("/Length 6 0 R"), as some PDF writers do
+    """
+    length = b"6 0 R" if indirect_length else b"%d" % len(content)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792]"
+        b" /Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        b"<< /Length " + length + b" >>\nstream\n" + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    if indirect_length:
+        objects.append(b"%d" % len(content))
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+
+def test_pdf_words_spaced_by_kerning_stay_apart():
+    # LaTeX-style output: no space characters, the gaps come from the -300 moves
+    pdf = _pdf(b"BT /F1 12 Tf 72 720 Td [(Machine) -300 (learning) -300 (is) -300 (great)] TJ ET")
+
+    chunks = DocumentProcessor().process_document_stream(io.BytesIO(pdf), "paper.pdf")
+
+    assert chunks[0]["content"].split() == ["Machine", "learning", "is", "great"]
+
+
+def test_pdf_text_flags_clip_to_the_page_and_keep_spaces():
+    # Recent PyMuPDF clips to the page on its own, so check the flags directly
+    assert PDF_TEXT_FLAGS & fitz.TEXT_MEDIABOX_CLIP
+    assert not PDF_TEXT_FLAGS & fitz.TEXT_INHIBIT_SPACES
+
+
+def test_stored_stream_length_reads_direct_and_indirect_length():
+    content = b"BT /F1 12 Tf 72 720 Td (Hello) Tj ET"
+    for indirect in (False, True):
+        doc = fitz.open(stream=_pdf(content, indirect_length=indirect), filetype="pdf")
+        (xref,) = doc[0].get_contents()
+        assert _stored_stream_length(doc, xref) == len(content)
+
+
+def test_heavy_pages_are_skipped_unless_switched_off(monkeypatch):
+    # Lots of drawing plus a line of text
+    content = b"0 0 m 100 100 l S\n" * 2000 + b"BT /F1 12 Tf 72 720 Td (Caption) Tj ET"
+    pdf = _pdf(content)
+
+    monkeypatch.setattr(document_processor, "HEAVY_PAGE_STREAM_BYTES", 10_000)
+    assert len(DocumentProcessor().process_document_stream(io.BytesIO(pdf), "plot.pdf")) == 0
+
+    monkeypatch.setattr(document_processor, "HEAVY_PAGE_STREAM_BYTES", 0)
+    chunks = DocumentProcessor().process_document_stream(io.BytesIO(pdf), "plot.pdf")
+    assert chunks[0]["content"] == "Caption"
+
+
+def _random_text(rng: random.Random) -> str:
+    """Words of random length (some longer than a chunk) and random whitespace"""
+    words = ["x" * rng.choice([1, 3, 8, 40, 130]) for _ in range(rng.randrange(0, 60))]
+    gaps = [rng.choice([" ", "  ", "\n", "\n\n", " \t "]) for _ in range(len(words) + 1)]
+    text = "".join(gap + word for gap, word in zip(gaps, words))
+    return text + gaps[-1] if rng.random() < 0.5 else text
+
+
+def _windows(pack, text, chunk_size, chunk_overlap):
+    gap_starts, gap_ends = _boundary_offsets(text)
+    starts, ends = pack(gap_starts, gap_ends, len(text), chunk_size, chunk_overlap)
+    return starts.tolist(), ends.tolist()
+
+
+@pytest.mark.parametrize("pack", [_pack_windows, _pack_windows_loop], ids=["selected", "loop"])
+def test_packers_match_the_numpy_packer(pack):
+    # _pack_windows is the numba-compiled loop when numba is installed
+    rng = random.Random(0)
+    for _ in range(500):
+        text = _random_text(rng)
+        chunk_size = rng.choice([1, 5, 20, 100, 250])
+        chunk_overlap = rng.choice([0, 1, 10, 50, 300])
+        expected = _windows(_pack_windows_numpy, text, chunk_size, chunk_overlap)
+        assert _windows(pack, text, chunk_size, chunk_overlap) == expected, (text, chunk_size, chunk_overlap)
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(50, 0), (50, 10), (100, 99), (50, 50), (30, 200)])
+def test_chunks_stay_within_chunk_size_and_cover_every_word(chunk_size, chunk_overlap):
+    # Includes overlap >= chunk_size, which must still make progress
+    rng = random.Random(chunk_size * 1000 + chunk_overlap)
+    for _ in range(100):
+        text = _random_text(rng)
+        starts, ends = _windows(_pack_windows, text, chunk_size, chunk_overlap)
+
+        assert starts == sorted(starts) and len(set(starts)) == len(starts)
+        covered = np.zeros(len(text), dtype=bool)
+        for start, end in zip(starts, ends):
+            chunk = text[start:end]
+            assert 0 < len(chunk) <= chunk_size
+            assert chunk == chunk.strip()
+            covered[start:end] = True
+        assert all(text[i].isspace() for i in np.flatnonzero(~covered))
+
+
+@pytest.mark.parametrize("text", ["", " ", "\n\n\t  \n"])
+def test_empty_or_whitespace_text_gives_no_chunks(text):
+    chunks = DocumentProcessor(chunk_size=100, chunk_overlap=20).process_document_stream(
+        io.BytesIO(text.encode("utf-8")), "empty.txt"
+    )
+    assert len(chunks) == 0
+    assert list(chunks) == []
@@ -0,0 +1,109 @@
+# backend/tests/test_vector_store.py
+
+"""
+Tests for saving and loading the vector store
+
+The real embedding model is swapped for a tiny fake one, so these run in
+a second without downloading anything. Run from the backend folder with:
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+# The backend modules import each other by plain name (e.g. `import vector_store`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vector_store  # noqa: E402
+from vector_store import VectorStore  # noqa: E402
+
+
+class FakeEncoder:
+    """Gives every text a fixed random unit vector, seeded by the text"""
+
+    dimension = 32
+    batch_size = 64
+
+    def encode(self, texts, batch_size=32):
+        vectors = np.stack([
+            np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.dimension)
+            for text in texts
+        ]).astype("float32")
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture(autouse=True)
+def fake_encoder(monkeypatch):
+    monkeypatch.setattr(vector_store, "load_encoder", lambda model_name, backend=None: FakeEncoder())
+
+
+def _chunks(name, count):
+    return [{"content": f"{name} chunk {i}", "metadata": {"source": f"{name}.txt"}} for i in range(count)]
+
+
+def test_save_load_save_round_trip(tmp_path):
+    cache_dir = str(tmp_path)
+
+    store = VectorStore(cache_dir=cache_dir)
+    asyncio.run(store.add_documents(_chunks("a", 5), "a"))
+    asyncio.run(store.add_documents(_chunks("b", 3), "b"))
+    asyncio.run(store.delete_document("a"))
+    store.save_to_disk(store.cache_path)
+
+    # Loaded texts are memory-mapped from the very file we save over
+    reloaded = VectorStore(cache_dir=cache_dir)
+    reloaded.save_to_disk(reloaded.cache_path)
+    asyncio.run(reloaded.add_documents(_chunks("c", 2), "c"))
+    reloaded.save_to_disk(reloaded.cache_path)
+
+    final = VectorStore(cache_dir=cache_dir)
+    assert final.ntotal == 5
+    assert sorted(final.doc_to_chunks) == ["b", "c"]
+    assert [final.contents[i] for i in range(5, 10)] == [f"b chunk {i}" for i in range(3)] + ["c chunk 0", "c chunk 1"]
+    assert not any(name.endswith(".tmp") for name in os.listdir(cache_dir))
+
+    hits = asyncio.run(final.similarity_search("c chunk 1", k=1))
+    assert hits[0].doc["content"] == "c chunk 1"
+    assert hits[0].doc["metadata"] == {"source": "c.txt", "chunk_id": 1, "total_chunks": 2, "doc_id": "c"}
+
+
+def test_results_found_before_an_add_are_not_cached():
+    store = VectorStore()
+
+    async def scenario():
+        await store.add_documents(_chunks("old", 20), "old")
+        query = store.encode_query("brand new fact")
+        # The add lands while the search is still waiting for its batch
+        await asyncio.gather(
+            store.search_by_vector(query, k=1),
+            store.add_documents(
+                [{"content": "brand new fact", "metadata": {"source": "new.txt"}}], "new", embeddings=query
+            ),
+        )
+        return await store.similarity_search("brand new fact", k=1)
+
+    hits = asyncio.run(scenario())
+    assert hits[0].doc["content"] == "brand new fact"
+
+
+def test_save_skips_a_store_without_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = VectorStore()
+    asyncio.run(store.add_documents(_chunks("a", 2), "a"))
+    asyncio.run(store.save())
+    assert os.listdir(tmp_path) == []
+
+
+def test_save_writes_pending_chunks(tmp_path):
+    store = VectorStore(cache_dir=str(tmp_path))
+    asyncio.run(store.add_documents(_chunks("a", 2), "a"))
+    asyncio.run(store.save())
+
+    reloaded = VectorStore(cache_dir=str(tmp_path))
+    assert reloaded.ntotal == 2
+    assert sorted(os.listdir(tmp_path)) == ["store.faiss", "store.npz", "store.txt"]
@@ -12,10 +12,226 @@ Imagine if every book had a "DNA code" that represented its content - that's wha
 
 import faiss  # Facebook's library for fast similarity search
 import numpy as np  # For working with arrays of numbers
-from sentence_transformers import SentenceTransformer  # Converts text to vectors
-from typing import List, Dict, Any, Tuple  # For type hints
-import pickle  # For saving/loading data
+from typing import List, Dict, Any, Callable, Literal, NamedTuple, Optional, Tuple  # For type hints
+from collections.abc import MutableSequence  # Base class for the lazily loaded text list
 import os     # For file operations
+import functools  # For caching query vectors
+import asyncio    # For running the model without blocking
+import logging    # For progress messages (cheap when switched off)
+import uuid       # For unique temporary file names
+from encoder_backends import load_encoder  # Converts text to vectors
+
+try:
+    from numba import njit  # Compiles the search-hit filter to machine code
+except ImportError:  # numba is optional - we fall back to a NumPy version
+    njit = None
+
+# Messages from this file go through a logger rather than print(), so they
+# cost next to nothing when the log level hides them
+logger = logging.getLogger(__name__)
+
+# CPU threads FAISS may use for searching and training (all cores by
+# default; set FAISS_THREADS to override). Set once, when this file is imported
+FAISS_THREADS = int(os.getenv("FAISS_THREADS", str(os.cpu_count() or 1)))
+faiss.omp_set_num_threads(FAISS_THREADS)
+
+# How many recent query vectors to remember (questions are often asked again)
+QUERY_CACHE_SIZE = 1024
+
+# Search results are remembered too. A new question whose vector is at least
+# this similar to a remembered one gets the same chunks back without searching
+# (rephrasings like "what is RAG?" / "What's RAG" land well above this)
+SEMANTIC_CACHE_THRESHOLD = 0.97
+RESULT_CACHE_SIZE = 1024
+
+# Below this many chunks we compare the question with every chunk (exact and
+# fast enough). Above it we switch to an IVF index, which groups similar
+# chunks into clusters and only looks inside the closest few clusters
+ANN_MIN_VECTORS = 5000
+
+# How many clusters an IVF index searches per question - more is slower
+# but less likely to miss a good match
+IVF_NPROBE = 16
+
+# Chunk texts from concurrent add_documents calls are gathered into one model
+# call until they add up to ENCODE_TOKEN_BUDGET tokens (roughly 4 characters
+# each) or ENCODE_WINDOW_SECONDS have passed since the first one arrived
+ENCODE_TOKEN_BUDGET = 4096
+ENCODE_WINDOW_SECONDS = 0.05
+
+# Questions searched together: up to SEARCH_BATCH_SIZE of them, arriving
+# within SEARCH_WINDOW_SECONDS of the first one
+SEARCH_BATCH_SIZE = 32
+SEARCH_WINDOW_SECONDS = 0.005
+
+# New vectors wait in a buffer and go into the FAISS index together once
+# ADD_BUFFER_SIZE of them have piled up (or someone searches, saves or deletes)
+ADD_BUFFER_SIZE = 4096
+
+# Ways to shrink the stored vectors (see VectorStore.__init__)
+Compression = Literal["none", "sq_fp16", "sq_bf16", "sq_int8", "ivfpq"]
+
+# Scalar quantizer used by each "sq_*" compression
+SQ_TYPES = {"sq_fp16": "QT_fp16", "sq_bf16": "QT_bf16", "sq_int8": "QT_8bit"}
+
+# 8-bit codes need the range of every vector component, which is learned
+# from the first SQ_INT8_MIN_VECTORS vectors (until then they're kept as is)
+SQ_INT8_MIN_VECTORS = 1000
+
+# IVFPQ settings: IVFPQ_NLIST clusters, and each vector squeezed into
+# PQ_M one-byte codes (32 bytes instead of 1.5 KB for 384 numbers)
+IVFPQ_NLIST = 256
+PQ_M = 32
+PQ_NBITS = 8
+
+# The per-chunk metadata columns of a VectorStore and their types
+CHUNK_COLUMNS = {
+    "sources": object,         # File name each chunk came from
+    "chunk_ids": np.int32,     # Chunk number within its file
+    "total_chunks": np.int32,  # How many chunks its file has
+    "doc_ids": object,         # Document each chunk belongs to
+    "deleted": bool,           # True once its document is deleted
+}
+
+
+class Hit(NamedTuple):
+    """
+    One search result: a chunk and how similar it is to the question
+    
+    A tuple underneath, so `for doc, score in results` keeps working -
+    it just costs less to create than a dataclass and has no per-object dict.
+    """
+    doc: Dict[str, Any]  # The chunk (content + metadata)
+    score: float         # Similarity, higher is better
+
+
+def _filter_hits_numpy(indices: np.ndarray, scores: np.ndarray, deleted: np.ndarray,
+                       n_docs: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Keep the search hits that point at a real, not deleted chunk
+    
+    Args:
+        indices, scores: One row of FAISS search results (-1 marks "no hit")
+        deleted: True for every chunk position that was deleted
+        n_docs: Number of chunk positions
+        
+    Returns:
+        (indices, scores) of the hits worth turning into results, best first
+    """
+    valid = (indices >= 0) & (indices < n_docs)
+    valid[valid] = ~deleted[indices[valid]]
+    return indices[valid], scores[valid]
+
+
+def _filter_hits_loop(indices: np.ndarray, scores: np.ndarray, deleted: np.ndarray,
+                      n_docs: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Same as _filter_hits_numpy, written as a plain loop for numba"""
+    kept_indices = np.empty(indices.shape[0], dtype=np.int64)
+    kept_scores = np.empty(indices.shape[0], dtype=np.float32)
+    count = 0
+    for i in range(indices.shape[0]):
+        idx = indices[i]
+        if 0 <= idx < n_docs and not deleted[idx]:
+            kept_indices[count] = idx
+            kept_scores[count] = scores[i]
+            count += 1
+    return kept_indices[:count], kept_scores[:count]
+
+
+# With numba installed the loop version is compiled (and cached on disk)
+if njit is not None:
+    _filter_hits = njit(cache=True)(_filter_hits_loop)
+else:
+    _filter_hits = _filter_hits_numpy
+
+
+async def _collect_batch(queue: asyncio.Queue, window_seconds: float, budget: int,
+                         weight: Callable[[Any], int] = lambda request: 1) -> list:
+    """
+    Wait for one (request, future) pair, then keep taking more from the queue
+    until their total weight reaches budget or window_seconds have passed
+    """
+    loop = asyncio.get_running_loop()
+    batch = [await queue.get()]
+    total = weight(batch[0][0])
+    deadline = loop.time() + window_seconds
+    
+    while total < budget:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            request, future = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            break
+        batch.append((request, future))
+        total += weight(request)
+    return batch
+
+
+def _fail_batch(batch: list, error: Exception):
+    """Pass an error on to everyone waiting on a batch"""
+    for _, future in batch:
+        if not future.done():  # The caller may have given up waiting
+            future.set_exception(error)
+
+
+class StoredTexts(MutableSequence):
+    """
+    The chunk texts of a vector store loaded from disk
+    
+    All texts sit back to back in one memory-mapped file, so loading is
+    instant and a text is only read when it's actually needed - usually just
+    the handful of chunks returned by a search. Behaves like the plain list it
+    replaces: texts can be looked up, set to None (deleted) or appended.
+    """
+    
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        """
+        Args:
+            blob: Every chunk's UTF-8 text, concatenated
+            offsets: Chunk i's text is blob[offsets[i]:offsets[i + 1]]
+        """
+        self._blob = blob
+        self._offsets = offsets
+        self._stored = len(offsets) - 1  # Texts that live in the file
+        self._replaced: Dict[int, Optional[str]] = {}  # Stored texts changed since loading
+        self._added: List[Optional[str]] = []  # Texts added since loading
+    
+    def __len__(self) -> int:
+        return self._stored + len(self._added)
+    
+    def _position(self, i: int) -> int:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+        return i
+    
+    def __getitem__(self, i: int) -> Optional[str]:
+        i = self._position(i)
+        if i >= self._stored:
+            return self._added[i - self._stored]
+        if i in self._replaced:
+            return self._replaced[i]
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes().decode('utf-8')
+    
+    def __setitem__(self, i: int, text: Optional[str]):
+        i = self._position(i)
+        if i >= self._stored:
+            self._added[i - self._stored] = text
+        else:
+            self._replaced[i] = text
+    
+    def __delitem__(self, i: int):
+        # A chunk's position is its ID in the FAISS index, so nothing may shift
+        raise TypeError("texts can't be removed, set them to None instead")
+    
+    def insert(self, i: int, text: Optional[str]):
+        if i != len(self):
+            raise TypeError("texts can only be added at the end")
+        self._added.append(text)
+
 
 class VectorStore:
     """
@@ -25,35 +241,202 @@ class VectorStore:
     3. Can quickly find similar content when you ask a question
     """
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", compression: Compression = "none",
+                 backend: Optional[str] = None, cache_dir: Optional[str] = None):
         """
         Initialize our vector store
         
         Args:
             model_name: Which AI model to use for converting text to vectors
                        "all-MiniLM-L6-v2" is fast and good for most uses
+            compression: How to store the vectors in memory
+                       "none"    - full 32-bit floats (most accurate)
+                       "sq_fp16" - 16-bit floats, half the memory
+                       "sq_bf16" - 16-bit "brain floats": half the memory,
+                                   fast on CPUs with AVX512-BF16
+                       "sq_int8" - one byte per number, a quarter of the memory.
+                                   Kept uncompressed until there are
+                                   SQ_INT8_MIN_VECTORS to learn the ranges from
+                       "ivfpq"   - ~32 bytes per vector, for very large collections.
+                                   Vectors stay uncompressed until there are
+                                   enough of them to train the compressor
+            backend: Which engine runs the model - "pytorch" or "onnx"
+                       (defaults to the EMBEDDING_BACKEND environment variable)
+            cache_dir: Folder to keep the store in between runs. If a saved
+                       store is there it's loaded right away, so a restart
+                       doesn't have to convert every document again
+                       (save it with save_to_disk(self.cache_path))
         """
+        if compression not in ("none", "sq_fp16", "sq_bf16", "sq_int8", "ivfpq"):
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression in SQ_TYPES and not hasattr(faiss.ScalarQuantizer, SQ_TYPES[compression]):
+            raise ValueError(f"{compression} needs a newer FAISS version")
+        self.compression = compression
+        
         # This model converts text to vectors (arrays of 384 numbers)
-        self.model = SentenceTransformer(model_name)
+        self.encoder = load_encoder(model_name, backend)
         
         # Get the size of vectors this model creates
-        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.dimension = self.encoder.dimension
+        if compression == "ivfpq" and self.dimension % PQ_M:
+            raise ValueError(f"ivfpq needs a vector size divisible by {PQ_M}, got {self.dimension}")
         
         # Create a FAISS index - this is our searchable database
         # IndexFlatIP means "flat index with inner product" (good for similarity)
-        self.index = faiss.IndexFlatIP(self.dimension)
+        # It's upgraded to a clustered index once it grows (see _maybe_upgrade_index)
+        # The 16-bit formats need no training, so they're used from the start
+        if compression in ("sq_fp16", "sq_bf16"):
+            base_index = faiss.IndexScalarQuantizer(
+                self.dimension, getattr(faiss.ScalarQuantizer, SQ_TYPES[compression]),
+                faiss.METRIC_INNER_PRODUCT,
+            )
+        else:
+            base_index = faiss.IndexFlatIP(self.dimension)
+        
+        # IndexIDMap2 lets us give every vector our own ID (its chunk
+        # position, see below) and remove vectors by ID when a document is deleted.
+        # (IVF indexes can do this on their own, so they aren't wrapped)
+        self.index = faiss.IndexIDMap2(base_index)
+        
+        # Vectors added but not yet in the index (see flush). They are the
+        # last _pending_count chunk positions
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_count = 0
+        
+        # Store the actual text content and metadata alongside the vectors.
+        # Instead of one dict per chunk, each field is its own column and
+        # chunk i is row i of every column (much less memory per chunk).
+        # Deleted chunks keep their row so positions stay the same.
+        self.contents: MutableSequence = []  # Chunk texts (a list, or StoredTexts after load_from_disk)
         
-        # Store the actual text content alongside the vectors
-        self.documents: List[Dict[str, Any]] = []
+        # The metadata columns (see CHUNK_COLUMNS) have room to spare, like a
+        # Python list: they double in size when full, so adding a batch
+        # doesn't copy every earlier row. Only the first _n_rows are in use;
+        # self.sources, self.deleted etc. give you exactly those
+        self._columns = {name: np.empty(0, dtype=dtype) for name, dtype in CHUNK_COLUMNS.items()}
+        self._n_rows = 0
         
         # Keep track of which chunks belong to which documents
         self.doc_to_chunks: Dict[str, List[int]] = {}
         
+        # Converting a question to a vector means running the model, so we
+        # remember the vectors for recently asked questions
+        self._embed = functools.lru_cache(maxsize=QUERY_CACHE_SIZE)(self._encode_query)
+        
+        # Semantic result cache: the vectors of past questions in a tiny index
+        # of their own, and (k, results) for each of them in the same order
+        self._result_cache_index = faiss.IndexFlatIP(self.dimension)
+        self._result_cache_values: List[Tuple[int, List[Hit]]] = []
+        # Goes up every time the cache is cleared, so a search can tell whether
+        # the chunks changed while it was running (see search_by_vector)
+        self._result_cache_generation = 0
+        
+        # Request queue and background task of each batching worker
+        # (created on first use, see _submit)
+        self._workers: Dict[str, Tuple[asyncio.Queue, asyncio.Task]] = {}
+        
+        # Searches run in a background thread, so anything that changes the
+        # FAISS index (adding, removing, upgrading) has to wait for them to
+        # finish - and they for it. One lock per event loop (see _index_lock)
+        self._index_lock_for: Tuple[Optional[asyncio.AbstractEventLoop], Optional[asyncio.Lock]] = (None, None)
+        
+        # Pick up where the last run left off
+        self.cache_path = os.path.join(cache_dir, "store") if cache_dir else None
+        if self.cache_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.load_from_disk(self.cache_path)
+        
+    @property
+    def sources(self) -> np.ndarray:
+        return self._columns["sources"][:self._n_rows]
+    
+    @property
+    def chunk_ids(self) -> np.ndarray:
+        return self._columns["chunk_ids"][:self._n_rows]
+    
+    @property
+    def total_chunks(self) -> np.ndarray:
+        return self._columns["total_chunks"][:self._n_rows]
+    
+    @property
+    def doc_ids(self) -> np.ndarray:
+        return self._columns["doc_ids"][:self._n_rows]
+    
+    @property
+    def deleted(self) -> np.ndarray:
+        return self._columns["deleted"][:self._n_rows]
+    
+    def _append_rows(self, **values: list):
+        """
+        Add rows to the metadata columns (one list per column, deleted=False)
+        
+        When a column is full it's copied into one twice as big, so over many
+        calls each row is only copied a handful of times.
+        """
+        n_new = len(values["sources"])
+        needed = self._n_rows + n_new
+        capacity = len(self._columns["sources"])
+        if needed > capacity:
+            capacity = max(needed, 2 * capacity, 1024)
+            for name, column in self._columns.items():
+                grown = np.zeros(capacity, dtype=column.dtype)
+                grown[:self._n_rows] = column[:self._n_rows]
+                self._columns[name] = grown
+        
+        rows = slice(self._n_rows, needed)
+        for name, column_values in values.items():
+            self._columns[name][rows] = column_values
+        self._columns["deleted"][rows] = False
+        self._n_rows = needed
+    
     def is_initialized(self) -> bool:
         """Check if we have any documents stored yet"""
-        return self.index.ntotal > 0
+        return self.ntotal > 0
+    
+    @property
+    def ntotal(self) -> int:
+        """Number of stored vectors, including the ones still waiting in the buffer"""
+        return self.index.ntotal + self._pending_count
+    
+    def flush(self):
+        """
+        Put all buffered vectors into the FAISS index
+        
+        Adding vectors one small document at a time means paying FAISS's
+        per-call overhead over and over, so add_documents only buffers them.
+        Searching, saving and deleting flush first; call this yourself if you
+        need new chunks to be in self.index right away.
+        
+        Not safe while a search may be running - from async code, use
+        `await self._flush_locked()` instead.
+        """
+        if not self._pending_vectors:
+            return
+        
+        embeddings = np.vstack(self._pending_vectors)
+        start_idx = len(self.contents) - self._pending_count  # First buffered chunk position
+        self.index.add_with_ids(embeddings, np.arange(start_idx, start_idx + len(embeddings), dtype='int64'))
+        self._pending_vectors = []
+        self._pending_count = 0
+        self._maybe_upgrade_index()
+    
+    def _index_lock(self) -> asyncio.Lock:
+        """The lock guarding self.index on the running event loop"""
+        loop = asyncio.get_running_loop()
+        lock_loop, lock = self._index_lock_for
+        if lock_loop is not loop:
+            lock = asyncio.Lock()
+            self._index_lock_for = (loop, lock)
+        return lock
+    
+    async def _flush_locked(self):
+        """flush(), once no search is using the index"""
+        if self._pending_vectors:
+            async with self._index_lock():
+                self.flush()
     
-    async def add_documents(self, chunks: List[Dict[str, Any]], doc_id: str):
+    async def add_documents(self, chunks: List[Dict[str, Any]], doc_id: str,
+                            embeddings: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Add document chunks to our vector store
         
@@ -65,35 +448,187 @@ class VectorStore:
         Args:
             chunks: List of text chunks with metadata
             doc_id: Unique identifier for this document
+            embeddings: Vectors for the chunks if we already have them
+                       (e.g. from a cache) - skips the model entirely
+            
+        Returns:
+            The chunk vectors, one row per chunk
+        """
+        return await self.add_documents_batch([(chunks, doc_id)], embeddings)
+    
+    async def add_documents_batch(self, batch: List[Tuple[List[Dict[str, Any]], str]],
+                                  embeddings: Optional[np.ndarray] = None) -> np.ndarray:
         """
-        # Extract just the text content from each chunk
-        texts = [chunk["content"] for chunk in chunks]
+        Add chunks from several documents at once
         
-        # Convert all texts to vectors (this is the AI magic!)
-        # normalize_embeddings=True makes all vectors the same length for fair comparison
-        print(f"Converting {len(texts)} chunks to vectors...")
-        embeddings = self.model.encode(texts, normalize_embeddings=True)
+        All chunks are converted to vectors in a single model call, which is
+        much faster than one call per document when many small documents
+        arrive together. Calls made at the same time are combined further by
+        the encoder worker (see _encoder_worker).
         
-        # Add vectors to our searchable index
-        start_idx = len(self.documents)  # Where to start numbering new chunks
-        self.index.add(embeddings.astype('float32'))  # FAISS likes 32-bit floats
+        Args:
+            batch: List of (chunks, doc_id) pairs, one per document
+            embeddings: Vectors for all the chunks, in order, if we already have them
+            
+        Returns:
+            The chunk vectors for the whole batch, one row per chunk
+        """
+        # Read each document's chunks once - they may come in as a lazy
+        # sequence (see DocumentChunks)
+        batch = [(list(chunks), doc_id) for chunks, doc_id in batch]
+        
+        # Extract just the text content from each chunk, across all documents
+        texts = [chunk["content"] for chunks, _ in batch for chunk in chunks]
+        if not texts:
+            for _, doc_id in batch:
+                self.doc_to_chunks[doc_id] = []
+            return np.empty((0, self.dimension), dtype='float32')
+        
+        if embeddings is None:
+            # Convert all texts to vectors (this is the AI magic!)
+            # normalize_embeddings=True makes all vectors the same length for fair comparison
+            logger.debug("Converting %d chunks from %d document(s) to vectors", len(texts), len(batch))
+            embeddings = await self._encode_texts(texts)
+        embeddings = embeddings.astype('float32', copy=False)  # FAISS likes 32-bit floats (no copy if they already are)
+        
+        # Queue the vectors for our searchable index (see flush)
+        start_idx = len(self.contents)  # Where to start numbering new chunks
+        self._pending_vectors.append(embeddings)
+        self._pending_count += len(embeddings)
+        self._clear_result_cache()  # New chunks may be better answers to old questions
         
         # Store document metadata and track chunk locations
-        chunk_indices = []
-        for i, chunk in enumerate(chunks):
-            chunk_idx = start_idx + i
-            chunk_indices.append(chunk_idx)
+        sources, chunk_ids, total_chunks, doc_ids = [], [], [], []
+        for chunks, doc_id in batch:
+            for position, chunk in enumerate(chunks):
+                metadata = chunk["metadata"]
+                sources.append(metadata["source"])
+                chunk_ids.append(metadata.get("chunk_id", position))
+                total_chunks.append(metadata.get("total_chunks", len(chunks)))
+            doc_ids.extend([doc_id] * len(chunks))
+            
+            # Remember which chunks belong to this document (for deletion later)
+            self.doc_to_chunks[doc_id] = list(range(start_idx, start_idx + len(chunks)))
+            start_idx += len(chunks)
+        
+        # Add the batch's rows to every column
+        self.contents.extend(texts)
+        self._append_rows(sources=sources, chunk_ids=chunk_ids, total_chunks=total_chunks, doc_ids=doc_ids)
+        
+        if self._pending_count >= ADD_BUFFER_SIZE:
+            await self._flush_locked()
+        
+        logger.info("Added %d chunks to vector store. Total chunks: %d", len(texts), len(self.contents))
+        return embeddings
+    
+    async def add_many_documents(self, chunks_per_doc: Dict[str, List[Dict[str, Any]]]) -> np.ndarray:
+        """
+        Add a whole collection of documents in one go (e.g. a bulk import)
+        
+        Every chunk is converted in a single model call, and everything goes
+        into the FAISS index at once. If that's enough to switch to an IVF or
+        compressed index (see _maybe_upgrade_index), it's trained a single
+        time on all of the vectors instead of on whatever small batch
+        happened to cross the threshold.
+        
+        Args:
+            chunks_per_doc: {doc_id: chunks} for every document
             
-            # Add document ID to metadata so we know which doc this came from
-            chunk["metadata"]["doc_id"] = doc_id
-            self.documents.append(chunk)
+        Returns:
+            The chunk vectors, one row per chunk, in the dict's order
+        """
+        embeddings = await self.add_documents_batch(
+            [(chunks, doc_id) for doc_id, chunks in chunks_per_doc.items()]
+        )
+        await self._flush_locked()
+        return embeddings
+    
+    async def _submit(self, worker_name: str, request: Any) -> Any:
+        """
+        Hand a request to one of the batching workers and wait for its answer
         
-        # Remember which chunks belong to this document (for deletion later)
-        self.doc_to_chunks[doc_id] = chunk_indices
+        Each worker (_encoder_worker, _search_worker) gets its own queue and is
+        started on first use on the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        queue, task = self._workers.get(worker_name, (None, None))
+        if task is None or task.done() or task.get_loop() is not loop:
+            queue = asyncio.Queue()
+            task = loop.create_task(getattr(self, worker_name)(queue))
+            self._workers[worker_name] = (queue, task)
         
-        print(f"Added {len(chunks)} chunks to vector store. Total chunks: {len(self.documents)}")
+        future = loop.create_future()
+        await queue.put((request, future))
+        return await future
     
-    async def similarity_search(self, query: str, k: int = 5) -> List[Tuple[Dict[str, Any], float]]:
+    async def _encode_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Convert chunk texts to vectors, sharing the model call with any other
+        texts that arrive at about the same time
+        """
+        return await self._submit("_encoder_worker", texts)
+    
+    async def _encoder_worker(self, queue: asyncio.Queue):
+        """
+        Background task: collect encoding requests and run them as one batch
+        
+        A batch is closed once it holds ENCODE_TOKEN_BUDGET (estimated) tokens
+        or ENCODE_WINDOW_SECONDS after its first request. The model runs in a
+        background thread, and each caller gets back just its own rows.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = await _collect_batch(
+                queue, ENCODE_WINDOW_SECONDS, ENCODE_TOKEN_BUDGET,
+                weight=lambda texts: sum(len(text) for text in texts) // 4,
+            )
+            
+            all_texts = [text for texts, _ in requests for text in texts]
+            try:
+                embeddings = await loop.run_in_executor(
+                    None, self.encode_docs, all_texts
+                )
+            except Exception as e:
+                _fail_batch(requests, e)
+                continue
+            
+            # Hand each caller the rows for its own texts
+            offset = 0
+            for texts, future in requests:
+                if not future.done():  # The caller may have given up waiting
+                    future.set_result(embeddings[offset:offset + len(texts)])
+                offset += len(texts)
+    
+    async def _search_worker(self, queue: asyncio.Queue):
+        """
+        Background task: run questions that arrive together as one FAISS search
+        
+        FAISS spreads a search over CPU cores per question, so one question at a
+        time leaves most cores idle. We wait up to SEARCH_WINDOW_SECONDS for up
+        to SEARCH_BATCH_SIZE questions, search them all at once with the largest
+        k anyone asked for, and give each caller its own row.
+        
+        The search itself runs in a background thread, so a big one doesn't
+        hold up everything else the server is doing meanwhile.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = await _collect_batch(queue, SEARCH_WINDOW_SECONDS, SEARCH_BATCH_SIZE)
+            
+            queries = np.vstack([query_embedding for (query_embedding, _), _ in requests])
+            max_k = max(k for (_, k), _ in requests)
+            try:
+                async with self._index_lock():
+                    scores, indices = await loop.run_in_executor(None, self.index.search, queries, max_k)
+            except Exception as e:
+                _fail_batch(requests, e)
+                continue
+            
+            for row, ((_, k), future) in enumerate(requests):
+                if not future.done():
+                    future.set_result((scores[row, :k], indices[row, :k]))
+    
+    async def similarity_search(self, query: str, k: int = 5) -> List[Hit]:
         """
         Search for documents similar to a query
         
@@ -104,82 +639,354 @@ class VectorStore:
             k: How many similar chunks to return
             
         Returns:
-            List of (document_chunk, similarity_score) pairs
+            List of Hit(doc, score) pairs, most similar first
         """
         if not self.is_initialized():
-            print("No documents in vector store yet!")
+            logger.debug("No documents in vector store yet")
             return []
         
         # Convert the query to a vector using the same model
-        print(f"Searching for: '{query}'")
-        query_embedding = self.model.encode([query], normalize_embeddings=True)
+        logger.debug("Searching for: %r", query)
+        query_embedding = await self.embed_query(query)
+        
+        return await self.search_by_vector(query_embedding, k)
+    
+    async def embed_query(self, query: str) -> np.ndarray:
+        """
+        Convert a query to a (1, dimension) vector
+        
+        The model runs in a background thread, so callers can do other work
+        (like building prompts) while they wait. Results are cached per query.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.encode_query, query)
+    
+    async def search_by_vector(self, query_embedding: np.ndarray, k: int = 5) -> List[Hit]:
+        """
+        Find the chunks most similar to an already converted query
+        
+        Args:
+            query_embedding: A (1, dimension) vector from embed_query
+            k: How many similar chunks to return
+            
+        Returns:
+            List of Hit(doc, score) pairs, most similar first
+        """
+        if not self.is_initialized():
+            logger.debug("No documents in vector store yet")
+            return []
+        
+        # Was (almost) the same question asked before?
+        cached = self._cached_results(query_embedding, k)
+        if cached is not None:
+            logger.debug("Reusing %d results from a similar earlier question", len(cached))
+            return list(cached)
         
         # Search in our FAISS index for the most similar vectors
-        scores, indices = self.index.search(query_embedding.astype('float32'), k)
+        # (together with any other questions being asked right now)
+        generation = self._result_cache_generation
+        await self._flush_locked()
+        scores, indices = await self._submit("_search_worker", (query_embedding, k))
+        
+        # Drop padding (-1) and deleted chunks, then turn the rest into documents
+        hit_indices, hit_scores = _filter_hits(indices, scores, self.deleted, len(self.contents))
+        # tolist() turns each array into Python ints/floats in one go,
+        # rather than converting one NumPy scalar per hit
+        results = [Hit(self._chunk(idx), score) for idx, score in zip(hit_indices.tolist(), hit_scores.tolist())]
         
-        # Convert results back to documents with scores
-        results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.documents):  # Make sure index is valid
-                document = self.documents[idx]
-                similarity_score = float(score)
-                results.append((document, similarity_score))
-                print(f"Found match (score: {similarity_score:.3f}): {document['content'][:100]}...")
+        logger.debug("Found %d matches (best score: %.3f)", len(results),
+                     results[0].score if results else float("nan"))
         
+        # Chunks added or deleted meanwhile may change the answer, so results
+        # from before that are returned but not remembered
+        if generation == self._result_cache_generation:
+            self._remember_results(query_embedding, k, results)
         return results
     
+    def _chunk(self, idx: int) -> Dict[str, Any]:
+        """Build the chunk dict (content + metadata) for one chunk position"""
+        return {
+            "content": self.contents[idx],
+            "metadata": {
+                "source": self.sources[idx],
+                "chunk_id": int(self.chunk_ids[idx]),
+                "total_chunks": int(self.total_chunks[idx]),
+                "doc_id": self.doc_ids[idx],
+            },
+        }
+    
+    def _cached_results(self, query_embedding: np.ndarray, k: int
+                        ) -> Optional[List[Hit]]:
+        """
+        Look for an earlier question close enough to this one
+        
+        Returns:
+            That question's results if it's at least SEMANTIC_CACHE_THRESHOLD
+            similar and asked for the same k, otherwise None
+        """
+        if self._result_cache_index.ntotal == 0:
+            return None
+        
+        scores, indices = self._result_cache_index.search(query_embedding, 1)
+        if scores[0][0] < SEMANTIC_CACHE_THRESHOLD:
+            return None
+        
+        cached_k, results = self._result_cache_values[indices[0][0]]
+        return results if cached_k == k else None
+    
+    def _remember_results(self, query_embedding: np.ndarray, k: int,
+                          results: List[Hit]):
+        """Store a question's vector and results in the semantic cache"""
+        if len(self._result_cache_values) >= RESULT_CACHE_SIZE:
+            self._clear_result_cache()  # Start over rather than track which entry is oldest
+        self._result_cache_index.add(query_embedding)
+        self._result_cache_values.append((k, results))
+    
+    def _clear_result_cache(self):
+        """Forget all remembered search results (the stored chunks changed)"""
+        self._result_cache_index.reset()
+        self._result_cache_values.clear()
+        self._result_cache_generation += 1
+    
+    def encode_query(self, query: str) -> np.ndarray:
+        """
+        Convert one question to a (1, dimension) float32 vector
+        
+        The last QUERY_CACHE_SIZE questions are remembered, so asking the same
+        thing again (e.g. a chat turn that is searched once more as history)
+        skips the model entirely. The returned array is shared by the cache,
+        so it's read-only.
+        """
+        return self._embed(query)
+    
+    def encode_docs(self, texts: List[str]) -> np.ndarray:
+        """
+        Convert many chunk texts to a (len(texts), dimension) float32 array
+        
+        Uses the large batch size that suits the encoder's hardware. Nothing
+        is cached - chunk texts rarely repeat. Blocks while the model runs;
+        add_documents uses this from a background thread.
+        """
+        return self.encoder.encode(texts, batch_size=self.encoder.batch_size)
+    
+    def _encode_query(self, query: str) -> np.ndarray:
+        """
+        The uncached part of encode_query (wrapped by self._embed)
+        
+        A single text goes through as a batch of one, without the
+        grouping and padding work a big batch needs.
+        """
+        embedding = self.encoder.encode([query], batch_size=1)
+        embedding.flags.writeable = False
+        return embedding
+    
     async def delete_document(self, doc_id: str):
         """
         Delete all chunks belonging to a document
         
-        Note: FAISS doesn't support deleting individual vectors easily,
-        so we mark them as deleted in metadata instead.
-        In production, you'd rebuild the index periodically.
+        The vectors are removed from the FAISS index (freeing their memory),
+        and the chunks are flagged as deleted (their texts dropped) so the
+        other chunks keep their positions.
         """
         if doc_id not in self.doc_to_chunks:
-            print(f"Document {doc_id} not found!")
+            logger.warning("Document %s not found", doc_id)
             return
         
-        # Mark all chunks from this document as deleted
-        chunk_indices = self.doc_to_chunks[doc_id]
-        deleted_count = 0
+        # Stop tracking the document first, so a second delete of it that
+        # arrives while we wait for the lock finds nothing to do
+        chunk_indices = self.doc_to_chunks.pop(doc_id)
         
+        # Remove all chunks from this document (some may still be buffered)
+        async with self._index_lock():
+            self.flush()
+            deleted_count = self.index.remove_ids(np.asarray(chunk_indices, dtype='int64'))
+        self.deleted[chunk_indices] = True
         for idx in chunk_indices:
-            if idx < len(self.documents):
-                self.documents[idx]["metadata"]["deleted"] = True
-                deleted_count += 1
+            self.contents[idx] = None
+        
+        self._clear_result_cache()
+        logger.info("Deleted %d chunks for document %s", deleted_count, doc_id)
+    
+    def _maybe_upgrade_index(self):
+        """
+        Switch from the exact flat index to an IVF index once we have
+        enough chunks
+        
+        The flat index compares the question with every single chunk, which
+        gets slow for big collections. IVF first sorts the chunks into
+        clusters and then only searches the IVF_NPROBE clusters closest to
+        the question. Every vector keeps its ID, so the chunk columns still
+        line up with the index.
+        
+        Without compression this happens at ANN_MIN_VECTORS chunks, with about
+        4 * sqrt(N) clusters. With "ivfpq" the flat index is just a buffer
+        until there are enough vectors to train IVFPQ_NLIST clusters and the
+        compressor (FAISS wants at least 39 training points per cluster).
+        With "sq_int8" it's swapped for an 8-bit index instead, once there are
+        SQ_INT8_MIN_VECTORS vectors to learn the value ranges from.
+        """
+        if not isinstance(self.index, faiss.IndexIDMap2):
+            return  # Already upgraded
+        base_index = faiss.downcast_index(self.index.index)
+        if not isinstance(base_index, faiss.IndexFlat):
+            return  # A compressed index that stays as is
+        
+        ntotal = base_index.ntotal
+        if self.compression == "sq_int8":
+            self._compress_to_int8(base_index)
+            return
+        
+        quantizer = faiss.IndexFlatIP(self.dimension)
+        if self.compression == "ivfpq":
+            nlist = IVFPQ_NLIST
+            if ntotal < nlist * 39:
+                return
+            index = faiss.IndexIVFPQ(quantizer, self.dimension, nlist, PQ_M, PQ_NBITS,
+                                     faiss.METRIC_INNER_PRODUCT)
+        elif ntotal >= ANN_MIN_VECTORS:
+            nlist = min(int(4 * np.sqrt(ntotal)), ntotal // 39)
+            index = faiss.IndexIVFFlat(quantizer, self.dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            return
+        
+        vectors = base_index.reconstruct_n(0, ntotal)
+        ids = faiss.vector_to_array(self.index.id_map)
+        logger.info("Upgrading vector index to %s with %d clusters (%d chunks)", type(index).__name__, nlist, ntotal)
+        
+        # FAISS never uses more than 256 points per cluster for training
+        sample_size = min(len(vectors), nlist * 256)
+        sample = np.random.default_rng(0).choice(len(vectors), sample_size, replace=False)
+        index.train(vectors[np.sort(sample)])
+        index.nprobe = IVF_NPROBE
         
-        # Remove from our tracking dictionary
-        del self.doc_to_chunks[doc_id]
-        print(f"Marked {deleted_count} chunks as deleted for document {doc_id}")
+        # IVF stores our IDs itself (and, unlike the flat index, doesn't
+        # renumber vectors after a removal, which IndexIDMap2 relies on)
+        index.add_with_ids(vectors, ids)
+        self.index = index
+    
+    def _compress_to_int8(self, base_index: faiss.IndexFlat):
+        """
+        Replace the flat index with an 8-bit scalar quantizer once there are
+        SQ_INT8_MIN_VECTORS vectors
+        
+        Each vector component is stored as one byte spread over the smallest
+        and largest value seen for that component during training. The
+        search still takes (and compares against) float32 questions.
+        """
+        ntotal = base_index.ntotal
+        if ntotal < SQ_INT8_MIN_VECTORS:
+            return
+        
+        vectors = base_index.reconstruct_n(0, ntotal)
+        ids = faiss.vector_to_array(self.index.id_map)
+        logger.info("Compressing %d vectors to 8-bit codes", ntotal)
+        
+        index = faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_8bit,
+                                           faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        
+        # A flat-style index renumbers after a removal, so it keeps its IndexIDMap2
+        self.index = faiss.IndexIDMap2(index)
+        self.index.add_with_ids(vectors, ids)
     
     def save_to_disk(self, filepath: str):
-        """Save the vector store to disk for persistence"""
+        """
+        Save the vector store to disk for persistence
+        
+        Writes three files:
+            {filepath}.faiss  - the FAISS index
+            {filepath}.txt    - all chunk texts back to back (UTF-8)
+            {filepath}.npz    - the metadata columns, plus where each chunk's
+                                text starts and ends in the .txt
+        """
+        # Everything is written to temporary files first and only then moved
+        # into place. The old .txt may be memory-mapped by this very store
+        # (after load_from_disk), so overwriting it in place would pull the
+        # texts out from under us - and a crash halfway would leave a broken store
+        self.flush()
+        paths = {ext: f"{filepath}{ext}" for ext in (".faiss", ".txt", ".npz")}
+        # Unique names, so two saves at once never write into each other's files
+        tmp_suffix = f".{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        tmp_paths = {ext: f"{path}{tmp_suffix}" for ext, path in paths.items()}
+        
         # Save FAISS index
-        faiss.write_index(self.index, f"{filepath}.faiss")
+        faiss.write_index(self.index, tmp_paths[".faiss"])
+        
+        # Save the texts in one file, remembering where each one starts
+        offsets = np.zeros(len(self.contents) + 1, dtype='int64')
+        with open(tmp_paths[".txt"], 'wb') as f:
+            for i, text in enumerate(self.contents):
+                data = text.encode('utf-8') if text is not None else b""  # Deleted chunks store no text
+                f.write(data)
+                offsets[i + 1] = offsets[i] + len(data)
         
-        # Save documents and metadata
-        with open(f"{filepath}.pkl", 'wb') as f:
-            pickle.dump({
-                'documents': self.documents,
-                'doc_to_chunks': self.doc_to_chunks
-            }, f)
+        # Save the metadata columns (through a file object, so numpy
+        # doesn't add its own .npz to the temporary name)
+        with open(tmp_paths[".npz"], 'wb') as f:
+            np.savez_compressed(
+                f,
+                offsets=offsets,
+                sources=np.array(self.sources.tolist(), dtype=str),
+                chunk_ids=self.chunk_ids,
+                total_chunks=self.total_chunks,
+                doc_ids=np.array(self.doc_ids.tolist(), dtype=str),
+                deleted=self.deleted,
+            )
         
-        print(f"Vector store saved to {filepath}")
+        # Swap the new files in. A mapping of the old .txt stays valid: it
+        # keeps the replaced file alive until the mapping is dropped
+        for ext, path in paths.items():
+            os.replace(tmp_paths[ext], path)
+        
+        logger.info("Vector store saved to %s", filepath)
+    
+    async def save(self):
+        """
+        save_to_disk(self.cache_path), once no search is using the index
+        
+        Does nothing for a store without a cache_dir.
+        """
+        if not self.cache_path:
+            return
+        async with self._index_lock():
+            self.save_to_disk(self.cache_path)
     
     def load_from_disk(self, filepath: str):
-        """Load the vector store from disk"""
-        if os.path.exists(f"{filepath}.faiss") and os.path.exists(f"{filepath}.pkl"):
+        """
+        Load the vector store from disk
+        
+        The chunk texts are memory-mapped rather than read, so this is quick
+        even for big stores (see StoredTexts). The FAISS index is read into
+        memory as usual - we keep adding to and removing from it, which a
+        read-only memory-mapped index can't do.
+        """
+        paths = [f"{filepath}{ext}" for ext in (".faiss", ".txt", ".npz")]
+        if all(os.path.exists(path) for path in paths):
             # Load FAISS index
             self.index = faiss.read_index(f"{filepath}.faiss")
+            self._pending_vectors = []
+            self._pending_count = 0
+            
+            # Load the metadata columns
+            with np.load(f"{filepath}.npz") as columns:
+                offsets = columns["offsets"]
+                self._columns = {name: columns[name].astype(dtype) for name, dtype in CHUNK_COLUMNS.items()}
+            self._n_rows = len(offsets) - 1
+            
+            # np.memmap can't map an empty file (a store with no text)
+            blob = (np.memmap(f"{filepath}.txt", dtype=np.uint8, mode='r')
+                    if offsets[-1] else np.empty(0, dtype=np.uint8))
+            self.contents = StoredTexts(blob, offsets)
+            
+            # Rebuild which chunks belong to which (not deleted) document
+            self.doc_to_chunks = {}
+            live = np.flatnonzero(~self.deleted)
+            for idx, doc_id in zip(live.tolist(), self.doc_ids[live].tolist()):
+                self.doc_to_chunks.setdefault(doc_id, []).append(idx)
             
-            # Load documents and metadata
-            with open(f"{filepath}.pkl", 'rb') as f:
-                data = pickle.load(f)
-                self.documents = data['documents']
-                self.doc_to_chunks = data['doc_to_chunks']
+            self._clear_result_cache()
             
-            print(f"Vector store loaded from {filepath}")
+            logger.info("Vector store loaded from %s", filepath)
             return True
         return False
 
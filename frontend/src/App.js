@@ -63,7 +63,7 @@ const RAGChatInterface = () => {
                 const result = await response.json();
                 setMessages(prev => [...prev, {
                     type: 'system',
-                    content: `Successfully uploaded "${result.filename}" with ${result.chunks_processed} chunks processed.`,
+                    content: result.message,
                     timestamp: new Date()
                 }]);
 
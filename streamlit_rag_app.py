@@ -1,26 +1,54 @@
+import os
+import sys
+
 import streamlit as st
 
 # Lightweight Streamlit entrypoint that ensures imports work on Streamlit Cloud
 st.set_page_config(page_title="RAG Chatbot", page_icon="📚")
 
+# The backend modules import each other by plain name (e.g. `from encoder_backends import ...`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
 try:
-    # Import the DocumentProcessor from the backend package
+    # Import the backend components
     from backend.document_processor import DocumentProcessor
+    from vector_store import VectorStore
+    from rag_pipeline import RAGPipeline
 except Exception:
     st.title("RAG Chatbot — startup error")
-    st.error("Failed to import `backend.document_processor`. Check your dependencies and Python path. See full logs for details.")
+    st.error("Failed to import the backend modules. Check your dependencies and Python path. See full logs for details.")
     # Re-raise so the platform logs contain the traceback for debugging
     raise
 
 
+# Where the vector store is kept between restarts
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", os.path.join("data", "vector_store"))
+
+
+@st.cache_resource(show_spinner="Loading models…")
+def _build_components():
+    # Streamlit reruns this script on every interaction; cache_resource builds
+    # everything once per server process and hands the same objects to every
+    # rerun. The embedding model loads here, and the vector store picks up
+    # whatever was saved in VECTOR_STORE_DIR
+    processor = DocumentProcessor()
+    vs = VectorStore(cache_dir=VECTOR_STORE_DIR)
+    # RAGPipeline needs an OpenAI key; without one we can still show the rest
+    pipeline = RAGPipeline(vs) if os.getenv("OPENAI_API_KEY") else None
+    return processor, vs, pipeline
+
+
 def main():
     st.title("RAG Chatbot — Streamlit entrypoint")
 
-    st.markdown("This lightweight entrypoint ensures the `backend.document_processor` module is imported correctly.")
+    st.markdown("This lightweight entrypoint ensures the backend modules are imported and loaded correctly.")
 
-    # Create the processor to verify import works at runtime
-    processor = DocumentProcessor()
+    # Create the components to verify imports work at runtime
+    processor, vs, pipeline = _build_components()
     st.info(f"DocumentProcessor ready (chunk_size={processor.chunk_size}, chunk_overlap={processor.chunk_overlap})")
+    st.info(f"Vector store ready ({vs.ntotal} chunks loaded from {VECTOR_STORE_DIR})")
+    if pipeline is None:
+        st.warning("OPENAI_API_KEY is not set - questions can't be answered yet.")
 
     st.write("You can now wire the rest of the Streamlit UI here.")
 